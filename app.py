@@ -1,25 +1,47 @@
-from flask import Flask, render_template, Response, redirect, url_for, request
+from flask import Flask, render_template, Response, redirect, url_for, request, send_file
 import os
 import json
+import atexit
+import functools
+import importlib.util
+import threading
+import time
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
 
+import config
+from metrics import (
+    ATTENDANCE_WRITES,
+    FACES,
+    FIREBASE_SECONDS,
+    FRAMES,
+    MATCHES,
+    REGISTRY,
+    STAGE_SECONDS,
+    STREAM_BYTES,
+    UNKNOWNS,
+    Gauge,
+)
+from state import Lease, open_state, owner
+
 # --- MOCKING LOGIC START ---
 MOCK_MODE = False
 
 try:
-    import cv2
-    import face_recognition
-    import numpy as np
-    import cvzone
-    import pickle
-    import firebase_admin
-    from firebase_admin import credentials
-    from firebase_admin import db
-    from firebase_admin import storage
-    
+    # MOCK_MODE=1 forces mock mode, e.g. for the HTTP load test
+    if os.getenv("MOCK_MODE") == "1":
+        raise ImportError("MOCK_MODE=1 is set")
+
+    # the CV and Firebase stacks take seconds to import (dlib loads its
+    # models), so only check they are installed here; warm_up() imports them
+    # in the background while the web pages are already being served
+    for module in ("cv2", "face_recognition", "numpy", "cvzone", "firebase_admin"):
+        if importlib.util.find_spec(module) is None:
+            raise ImportError(f"No module named '{module}'")
+
     # Check for service key
     if not os.path.exists("serviceAccountKey.json"):
         raise ImportError("serviceAccountKey.json missing")
@@ -29,7 +51,6 @@ except ImportError as e:
     print("⚠️  SWITCHING TO MOCK MODE. Functionality will be limited.")
     MOCK_MODE = True
     import random
-    import time
     
     # Mock Objects
     class MockCV2:
@@ -118,17 +139,41 @@ except ImportError as e:
 
 app = Flask(__name__)
 
-if not MOCK_MODE:
-    # database credentials
-    cred = credentials.Certificate("serviceAccountKey.json")
-    firebase_admin.initialize_app(
-        cred,
-        {
-            "databaseURL": "https://cognito-2312c.firebaseio.com/",
-            "storageBucket": "cognito-2312c.firebasestorage.app",
-        },
-    )
-    bucket = storage.bucket()
+# recognition worker processes re-import this module when they are spawned;
+# only the server process connects to Firebase and owns the cameras
+SERVER = not MOCK_MODE and __name__ != "__mp_main__"
+# `python app.py` runs under the debug reloader, whose watcher process only
+# restarts the server in a child (marked by WERKZEUG_RUN_MAIN)
+if __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+    SERVER = False
+
+
+def write_attendance(updates):
+    with FIREBASE_SECONDS.time(op="attendance_update"):
+        db.reference().update(updates)
+
+
+def download_photo(id):
+    # only needed when this machine has no local copy of the original
+    with FIREBASE_SECONDS.time(op="photo_download"):
+        blob = bucket.get_blob(f"static/Files/Images/{id}.jpg")
+        return None if blob is None else blob.download_as_bytes()
+
+
+def read_students():
+    # the replica's initial load and reconciliation passes
+    with FIREBASE_SECONDS.time(op="students_read"):
+        return db.reference("Students").get()
+
+
+def listen_students(callback):
+    with FIREBASE_SECONDS.time(op="students_listen"):
+        return db.reference("Students").listen(callback)
+
+
+def sync_photos_in_background(job):
+    with FIREBASE_SECONDS.time(op="photo_sync"):
+        photo_sync.sync(delete=False)
 
 
 def dataset(id):
@@ -144,27 +189,66 @@ def dataset(id):
             "last_attendance_time": "2024-12-24 10:00:00"
         }, np.zeros((216, 216, 3), dtype=np.uint8), 0
         
-    studentInfo = db.reference(f"Students/{id}").get()
-    if studentInfo is not None:
-        blob = bucket.get_blob(f"static/Files/Images/{id}.jpg")
-        if blob is not None:
-            array = np.frombuffer(blob.download_as_string(), np.uint8)
-            imgStudent = cv2.imdecode(array, cv2.COLOR_BGRA2BGR)
-            if studentInfo["last_attendance_time"] is not None:
-                datetimeObject = datetime.strptime(studentInfo["last_attendance_time"], "%Y-%m-%d %H:%M:%S")
-                secondElapsed = (datetime.now() - datetimeObject).total_seconds()
-            else:
-                datetimeObject = None
-                secondElapsed = None
-            return studentInfo, imgStudent, secondElapsed
-    return None
+    studentInfo = students.get(id)
+    if studentInfo is None:
+        return None
+
+    # keyed by the photo's shared version, so a re-enrollment on any worker
+    # is seen here at once
+    key = id, shared.version(f"photo:{id}")
+    imgStudent = photo_cache.get(key)
+    if imgStudent is None:
+        path = thumbnails.path(id, 216)
+        if path is None:
+            return None
+        imgStudent = cv2.imread(path)
+        photo_cache.set(key, imgStudent)
+
+    if studentInfo["last_attendance_time"] is not None:
+        datetimeObject = datetime.strptime(studentInfo["last_attendance_time"], "%Y-%m-%d %H:%M:%S")
+        secondElapsed = (datetime.now() - datetimeObject).total_seconds()
+    else:
+        secondElapsed = None
+    return studentInfo, imgStudent, secondElapsed
+
+
+def forget_student(id):
+    shared.bump(f"photo:{id}")
+
 
+def mark_attendance(id, studentInfo, camera=None):
+    return bool(mark_attendance_many([(id, studentInfo)], camera))
 
-already_marked_id_student = []
-already_marked_id_admin = []
 
+def mark_attendance_many(marked, camera=None, flush=False):
+    """Count the students not yet present this session; returns their IDs."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    updates = []
+    for id, studentInfo in marked:
+        # another camera or worker may have marked the student first
+        if not ledger.mark(id, studentInfo, camera):
+            continue
+        studentInfo["total_attendance"] = studentInfo.get("total_attendance", 0) + 1
+        studentInfo["last_attendance_time"] = now
+        fields = {
+            "total_attendance": studentInfo["total_attendance"],
+            "last_attendance_time": studentInfo["last_attendance_time"],
+        }
+        # visible locally at once; the database write goes through the
+        # write-behind queue and comes back through the replica's listener
+        students.update(id, fields)
+        updates.append((id, fields))
+    ATTENDANCE_WRITES.inc(len(updates))
+    attendance_queue.put_many(updates, flush)
+    return [id for id, _ in updates]
+
+
+def mark_already_present(id, studentInfo, camera=None):
+    # marked within the last minute but in the previous session
+    ledger.mark(id, studentInfo, camera)
 
-def generate_frame():
+
+def generate_frame(camera_id, fps=None, quality=None):
     if MOCK_MODE:
         # Generate a dummy video feed with a message
         while True:
@@ -186,202 +270,266 @@ def generate_frame():
             time.sleep(0.1)
         return
 
-    # Original Logic
-    capture = cv2.VideoCapture(0)
-    capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-    imgBackground = cv2.imread("static/Files/Resources/background.png")
-
-    folderModePath = "static/Files/Resources/Modes/"
-    modePathList = os.listdir(folderModePath)
-    imgModeList = []
-
-    for path in modePathList:
-        imgModeList.append(cv2.imread(os.path.join(folderModePath, path)))
-
-    modeType = 0
-    id = -1
-    imgStudent = []
-    counter = 0
-
-    file = open("EncodeFile.p", "rb")
-    encodeListKnownWithIds = pickle.load(file)
-    file.close()
-    encodedFaceKnown, studentIDs = encodeListKnownWithIds
-
-    while True:
-        success, img = capture.read()
-
-        if not success:
-            break
-        else:
-            imgSmall = cv2.resize(img, (0, 0), None, 0.25, 0.25)
-            imgSmall = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
-
-            faceCurrentFrame = face_recognition.face_locations(imgSmall)
-            encodeCurrentFrame = face_recognition.face_encodings(
-                imgSmall, faceCurrentFrame
-            )
-
-            imgBackground[162 : 162 + 480, 55 : 55 + 640] = img
-            imgBackground[44 : 44 + 633, 808 : 808 + 414] = imgModeList[modeType]
-
-            if faceCurrentFrame:
-                for encodeFace, faceLocation in zip(
-                    encodeCurrentFrame, faceCurrentFrame
-                ):
-                    matches = face_recognition.compare_faces(
-                        encodedFaceKnown, encodeFace
-                    )
-                    faceDistance = face_recognition.face_distance(
-                        encodedFaceKnown, encodeFace
-                    )
-
-                    matchIndex = np.argmin(faceDistance)
-
-                    y1, x2, y2, x1 = faceLocation
-                    y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-
-                    bbox = 55 + x1, 162 + y1, x2 - x1, y2 - y1
-
-                    imgBackground = cvzone.cornerRect(imgBackground, bbox, rt=0)
-
-                    if matches[matchIndex] == True:
-                        id = studentIDs[matchIndex]
-
-                        if counter == 0:
-                            cvzone.putTextRect(
-                                imgBackground, "Face Detected", (65, 200), thickness=2
-                            )
-                            cv2.waitKey(1)
-                            counter = 1
-                            modeType = 1
-                    else:
-                        cvzone.putTextRect(
-                            imgBackground, "Face Detected", (65, 200), thickness=2
-                        )
-                        cv2.waitKey(3)
-                        cvzone.putTextRect(
-                            imgBackground, "Face Not Found", (65, 200), thickness=2
-                        )
-                        modeType = 4
-                        counter = 0
-                        imgBackground[44 : 44 + 633, 808 : 808 + 414] = imgModeList[
-                            modeType
-                        ]
-
-                if counter != 0:
-                    if counter == 1:
-                        studentInfo, imgStudent, secondElapsed = dataset(id)
-                        if secondElapsed > 60:
-                            ref = db.reference(f"Students/{id}")
-                            studentInfo["total_attendance"] += 1
-                            ref.child("total_attendance").set(
-                                studentInfo["total_attendance"]
-                            )
-                            ref.child("last_attendance_time").set(
-                                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            )
-                        else:
-                            modeType = 3
-                            counter = 0
-                            imgBackground[44 : 44 + 633, 808 : 808 + 414] = imgModeList[
-                                modeType
-                            ]
-
-                            already_marked_id_student.append(id)
-                            already_marked_id_admin.append(id)
-
-                    if modeType != 3:
-                        if 5 < counter <= 10:
-                            modeType = 2
-
-                        imgBackground[44 : 44 + 633, 808 : 808 + 414] = imgModeList[
-                            modeType
-                        ]
-
-                        if counter <= 5:
-                            cv2.putText(
-                                imgBackground,
-                                str(studentInfo["total_attendance"]),
-                                (861, 125),
-                                cv2.FONT_HERSHEY_COMPLEX,
-                                1,
-                                (255, 255, 255),
-                                1,
-                            )
-                            cv2.putText(
-                                imgBackground,
-                                str(studentInfo["major"]),
-                                (1006, 550),
-                                cv2.FONT_HERSHEY_COMPLEX,
-                                0.5,
-                                (255, 255, 255),
-                                1,
-                            )
-                            cv2.putText(
-                                imgBackground,
-                                str(id),
-                                (1006, 493),
-                                cv2.FONT_HERSHEY_COMPLEX,
-                                0.5,
-                                (255, 255, 255),
-                                1,
-                            )
-                            standing = studentInfo.get("standing", "N/A")
-                            cv2.putText(
-                                imgBackground,
-                                str(standing),
-                                (910, 625),
-                                cv2.FONT_HERSHEY_COMPLEX,
-                                0.6,
-                                (100, 100, 100),
-                                1,
-                            )
-                            
-                            
-
-                            (w, h), _ = cv2.getTextSize(
-                                str(studentInfo["name"]), cv2.FONT_HERSHEY_COMPLEX, 1, 1
-                            )
-
-                            offset = (414 - w) // 2
-                            cv2.putText(
-                                imgBackground,
-                                str(studentInfo["name"]),
-                                (808 + offset, 445),
-                                cv2.FONT_HERSHEY_COMPLEX,
-                                1,
-                                (50, 50, 50),
-                                1,
-                            )
-
-                            imgStudentResize = cv2.resize(imgStudent, (216, 216))
-
-                            imgBackground[
-                                175 : 175 + 216, 909 : 909 + 216
-                            ] = imgStudentResize
-
-                        counter += 1
-
-                        if counter >= 10:
-                            counter = 0
-                            modeType = 0
-                            studentInfo = []
-                            imgStudent = []
-                            imgBackground[44 : 44 + 633, 808 : 808 + 414] = imgModeList[
-                                modeType
-                            ]
+    for frame in cameras[camera_id].subscribe(fps, quality):
+        STREAM_BYTES.inc(len(frame), camera=camera_id)
+        yield (b"--frame\r\n" b"Content-Type: image/jpeg \r\n\r\n" + frame + b"\r\n")
 
-            else:
-                modeType = 0
-                counter = 0
 
-            ret, buffer = cv2.imencode(".jpeg", imgBackground)
-            frame = buffer.tobytes()
+def camera_lease(camera_id):
+    return f"camera:{camera_id}"
 
-        yield (b"--frame\r\n" b"Content-Type: image/jpeg \r\n\r\n" + frame + b"\r\n")
+
+def camera_partition_of(camera_id):
+    # rebinding goes through the shared state, since the POST may reach a
+    # worker other than the camera's; "" stands for the whole gallery
+    partition = shared.setting(f"partition:{camera_id}")
+    if partition is None:
+        return config.CAMERA_PARTITIONS.get(camera_id)
+    return partition or None
+
+
+def open_camera(camera_id):
+    # only one app worker may open a camera; the others answer 409 (see video)
+    lease = Lease(shared, camera_lease(camera_id), config.CAMERA_LEASE_TTL)
+    recognizer = recognizers[camera_id]
+    # the recognizer's process (and its models) starts with the first frame
+    # and lives only while this worker holds the camera
+    capture = CameraSource(config.CAMERAS[camera_id], lease, recognizer.shutdown)
+    kiosk = Kiosk(
+        dataset,
+        lambda id, studentInfo: mark_attendance(id, studentInfo, camera_id),
+        lambda id, studentInfo: mark_already_present(id, studentInfo, camera_id),
+        ledger.__contains__,
+    )
+
+    checked = 0.0
+
+    def recognize(img):
+        nonlocal checked
+        if time.monotonic() - checked >= 1.0:
+            recognizer.partition = camera_partition_of(camera_id)
+            checked = time.monotonic()
+        with STAGE_SECONDS.time(camera=camera_id, stage="recognize"):
+            faces = recognizer(img)
+        for stage, seconds in recognizer.timings.items():
+            STAGE_SECONDS.observe(seconds, camera=camera_id, stage=stage)
+        FRAMES.inc(camera=camera_id, stage="recognize")
+
+        matched = sum(1 for face in faces if face.match.accepted)
+        FACES.inc(len(faces), camera=camera_id)
+        MATCHES.inc(matched, camera=camera_id)
+        UNKNOWNS.inc(len(faces) - matched, camera=camera_id)
+
+        with STAGE_SECONDS.time(camera=camera_id, stage="update"):
+            kiosk.update(faces)
+
+    still = StillFrames(config.STREAM_STILL_THRESHOLD)
+
+    def observe_jpeg(seconds):
+        STAGE_SECONDS.observe(seconds, camera=camera_id, stage="jpeg")
+
+    frames = FramePool(observe=observe_jpeg)
+
+    def render(img):
+        # nothing new to show: keep the last frame instead of redrawing it
+        if still(img, kiosk.view):
+            FRAMES.inc(camera=camera_id, stage="unchanged")
+            return None
+        with STAGE_SECONDS.time(camera=camera_id, stage="composite"):
+            imgBackground = kiosk.render(img)
+        FRAMES.inc(camera=camera_id, stage="render")
+        return frames.next(imgBackground)
+
+    pipeline = Pipeline(capture, recognize, render)
+    return pipeline, lambda: {"recognizer": recognizer.stats()}
+
+
+ready = threading.Event()
+warmup = {"stage": "starting", "error": None, "seconds": None}
+
+
+def refresh_partitions(fields=None):
+    # called by the student replica whenever a record changes; attendance
+    # marks only touch other fields, so they skip the full regroup
+    if fields is not None and config.PARTITION_FIELD not in fields:
+        return
+    gallery.set_partitions(students.partitions(config.PARTITION_FIELD))
+
+
+def warm_up():
+    """Import the recognition and Firebase stacks and start every service.
+
+    Runs on a background thread at startup. Routes that need any of it wait
+    for ``ready`` (see ``needs_services``); /ready reports progress.
+    """
+    global cv2, np, firebase_admin, db, storage
+    global CameraSource, FramePool, Kiosk, Pipeline, StillFrames, recognize_photos
+    global shared, bucket, photo_sync, gallery, photo_cache, thumbnails, students, attendance_queue, ledger, enrollments
+    global recognizers, cameras
+
+    warmup["stage"] = "imports"
+    import cv2
+    import numpy as np
+    import firebase_admin
+    from firebase_admin import credentials
+    from firebase_admin import db
+    from firebase_admin import storage
+    from attendance import AttendanceQueue
+    from broadcast import Broadcaster
+    from cameras import CameraSource, RecognitionWorker
+    from cache import TTLCache
+    from gallery import FaceGallery
+    from jobs import JobQueue
+    from kiosk import Kiosk
+    from ledger import AttendanceLedger
+    from replica import StudentReplica
+    from pipeline import Pipeline
+    from recognition import recognize_photos
+    from storage_sync import PhotoSync
+    from streaming import FramePool, StillFrames
+    from thumbnails import Thumbnails
+
+    warmup["stage"] = "services"
+    # database credentials
+    cred = credentials.Certificate("serviceAccountKey.json")
+    firebase_admin.initialize_app(
+        cred,
+        {
+            "databaseURL": "https://cognito-2312c.firebaseio.com/",
+            "storageBucket": "cognito-2312c.firebasestorage.app",
+        },
+    )
+    # marks, the gallery version and camera leases, shared between app workers
+    shared = open_state(config.STATE_URL)
+    atexit.register(shared.close)
+    bucket = storage.bucket()
+    photo_sync = PhotoSync(bucket, manifest=config.PHOTO_MANIFEST, workers=config.STORAGE_SYNC_WORKERS)
+    gallery = FaceGallery(state=shared)
+    photo_cache = TTLCache(config.PHOTO_CACHE_SIZE, config.PHOTO_CACHE_TTL)
+    thumbnails = Thumbnails(config.THUMBNAIL_FOLDER, fetch=download_photo)
+    students = StudentReplica(
+        read_students,
+        listen_students,
+        config.STUDENT_REPLICA_DB,
+        config.STUDENT_REPLICA_RECONCILE,
+        on_change=refresh_partitions,
+    )
+    students.start()
+    atexit.register(students.close)
+    attendance_queue = AttendanceQueue(
+        write_attendance, config.ATTENDANCE_WAL, interval=config.ATTENDANCE_FLUSH_INTERVAL
+    )
+    atexit.register(attendance_queue.close)
+    ledger = AttendanceLedger(config.ATTENDANCE_DB, config.ATTENDANCE_SESSION, state=shared)
+    atexit.register(ledger.close)
+    enrollments = JobQueue(config.ENROLL_WORKERS)
+    atexit.register(enrollments.shutdown)
+
+    Gauge(
+        "cognito_attendance_queue_depth",
+        "Attendance marks waiting to be flushed to Firebase.",
+        lambda: attendance_queue.stats()["depth"],
+    )
+    for field in ("hits", "misses", "evictions"):
+        Gauge(
+            f"cognito_cache_{field}_total",
+            f"Cache {field} by cache.",
+            lambda field=field: {("photos",): photo_cache.stats()[field]},
+            ["cache"],
+            kind="counter",
+        )
+    Gauge("cognito_gallery_students", "Encodings in the face gallery.", lambda: len(gallery))
+    Gauge("cognito_replica_students", "Students in the local replica.", lambda: len(students))
+    Gauge(
+        "cognito_replica_events_total",
+        "Listener events applied to the local replica.",
+        lambda: students.events,
+        kind="counter",
+    )
+    Gauge("cognito_session_present", "Students marked present this session.", lambda: len(ledger))
+    Gauge(
+        "cognito_enrollment_jobs",
+        "Enrollment jobs by state.",
+        lambda: {(state,): count for state, count in enrollments.stats().items()},
+        ["state"],
+    )
+
+    warmup["stage"] = "recognizers"
+    motion = None
+    if config.MOTION_AREA > 0:
+        motion = {
+            "threshold": config.MOTION_THRESHOLD,
+            "area": config.MOTION_AREA,
+            "refresh": config.MOTION_REFRESH,
+        }
+    recognizers = {
+        camera_id: RecognitionWorker(
+            gallery.path,
+            gallery.partitions_path,
+            detect_interval=config.DETECT_INTERVAL,
+            track_ttl=config.TRACK_TTL,
+            motion=motion,
+            partition=config.CAMERA_PARTITIONS.get(camera_id),
+            fallback=config.PARTITION_FALLBACK,
+        )
+        for camera_id in config.CAMERAS
+    }
+    Gauge(
+        "cognito_recognizer_frames_total",
+        "Frames the motion gate let through to face detection, or held back.",
+        lambda: {
+            (camera_id, result): recognizer.stats().get(result, 0)
+            for camera_id, recognizer in recognizers.items()
+            for result in ("processed", "gated")
+        },
+        ["camera", "result"],
+        kind="counter",
+    )
+    Gauge(
+        "cognito_partition_fallbacks_total",
+        "Faces a camera's partition missed and the whole gallery recognized.",
+        lambda: {
+            (camera_id,): recognizer.stats().get("fallbacks", 0)
+            for camera_id, recognizer in recognizers.items()
+        },
+        ["camera"],
+        kind="counter",
+    )
+    cameras = {
+        camera_id: Broadcaster(lambda camera_id=camera_id: open_camera(camera_id))
+        for camera_id in config.CAMERAS
+    }
+    for recognizer in recognizers.values():
+        atexit.register(recognizer.shutdown)
+
+    # catch up on photos added while the app was down; only uploads, since a
+    # machine without local originals must not empty the bucket
+    enrollments.submit(sync_photos_in_background, subject="photo sync")
+    warmup["stage"] = "ready"
+
+
+def _run_warm_up():
+    start = time.perf_counter()
+    try:
+        warm_up()
+    except Exception as e:
+        warmup["error"] = f"{type(e).__name__}: {e}"
+        print(f"⚠️  WARM-UP FAILED: {warmup['error']}")
+        return
+    warmup["seconds"] = round(time.perf_counter() - start, 2)
+    ready.set()
+
+
+def needs_services(view):
+    # pages that use Firebase, the gallery or the cameras answer 503 until
+    # warm-up has finished instead of failing on a half-started app
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not MOCK_MODE and not ready.wait(config.WARMUP_WAIT):
+            return Response("Starting up, try again shortly", 503, {"Retry-After": "5"})
+        return view(*args, **kwargs)
+
+    return wrapper
 
 
 #########################################################################################################################
@@ -393,11 +541,84 @@ def index():
 
 
 @app.route("/video")
-def video():
+@app.route("/video/<camera_id>")
+@needs_services
+def video(camera_id=None):
+    if camera_id is None:
+        camera_id = next(iter(config.CAMERAS))
+    elif camera_id not in config.CAMERAS:
+        return f"Unknown camera {camera_id}", 404
+    if not MOCK_MODE:
+        holder = shared.holder(camera_lease(camera_id))
+        if holder not in (None, owner()):
+            return f"Camera {camera_id} is served by {holder}", 409
+    # clients can ask for a lower rate or quality than the configured maximum
+    fps = request.args.get("fps", config.STREAM_FPS, type=float)
+    quality = request.args.get("quality", config.STREAM_QUALITY, type=int)
+    fps = min(max(fps, 0.1), config.STREAM_FPS) if config.STREAM_FPS else max(fps, 0)
+    quality = min(max(quality, 10), config.STREAM_QUALITY)
     return Response(
-        generate_frame(), mimetype="multipart/x-mixed-replace; boundary=frame"
+        generate_frame(camera_id, fps, quality),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
     )
 
+@app.route("/video/stats")
+@needs_services
+def video_stats():
+    if MOCK_MODE:
+        return {"cameras": {}}
+    return {
+        "cameras": {
+            camera_id: dict(camera.stats(), holder=shared.holder(camera_lease(camera_id)))
+            for camera_id, camera in cameras.items()
+        }
+    }
+
+@app.route("/video/<camera_id>/partition", methods=["GET", "POST"])
+@needs_services
+def camera_partition(camera_id):
+    """Show or change the gallery partition a camera matches against."""
+    if MOCK_MODE:
+        return {"partition": None, "partitions": {}}
+    recognizer = recognizers.get(camera_id)
+    if recognizer is None:
+        return "Unknown camera", 404
+    if request.method == "POST":
+        # an empty partition goes back to the whole gallery
+        partition = request.form.get("partition") or None
+        if partition is not None and partition not in gallery.partitions:
+            return "Unknown partition", 404
+        # the worker holding the camera picks it up within a second
+        shared.set_setting(f"partition:{camera_id}", partition or "")
+    return {
+        "partition": camera_partition_of(camera_id),
+        "partitions": {name: len(ids) for name, ids in sorted(gallery.partitions.items())},
+    }
+
+@app.route("/ready")
+def readiness():
+    if MOCK_MODE:
+        return {"ready": True, "mock": True}
+    return dict(warmup, ready=ready.is_set()), 200 if ready.is_set() else 503
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/cache_stats")
+@needs_services
+def cache_stats():
+    if MOCK_MODE:
+        return {}
+    return {"photos": photo_cache.stats(), "replica": students.stats()}
+
+@app.route("/admin/queue_stats")
+@needs_services
+def queue_stats():
+    if MOCK_MODE:
+        return {}
+    return attendance_queue.stats()
+
 @app.route('/loginspage.html')
 def login():
     firebase_config = {
@@ -441,87 +662,160 @@ def home():
 
 
 @app.route("/admin")
+@needs_services
 def admin():
+    q = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+
     if MOCK_MODE:
-        return render_template("admin.html", data=[({
+        rows, total = [{
             "id": "123", "name": "Jyoti (Mock)", "major": "CS", "total_attendance": 10, "last_attendance_time": "Now"
-        }, None, None)])
-        
-    all_student_info = []
-    studentIDs, _ = add_image_database()
-    for i in studentIDs:
-        student_info = dataset(i)
-        if student_info is not None:
-            all_student_info.append(student_info)
-    return render_template("admin.html", data=all_student_info)
+        }], 1
+    else:
+        total = students.count(q)
+
+    pages = max(1, -(-total // config.ADMIN_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * config.ADMIN_PAGE_SIZE
+    if not MOCK_MODE:
+        rows = students.search(q, start, config.ADMIN_PAGE_SIZE)
+
+    return render_template(
+        "admin.html",
+        data=rows,
+        q=q,
+        page=page,
+        pages=pages,
+        total=total,
+    )
 
 
-@app.route("/admin/admin_attendance_list", methods=["GET", "POST"])
-def admin_attendance_list():
+@app.route("/admin/photo/<id>")
+@needs_services
+def student_photo(id):
     if MOCK_MODE:
-        return render_template("admin_attendance_list.html", data=[({
-            "id": "123", "name": "Jyoti (Mock)", "major": "CS", "total_attendance": 10, "last_attendance_time": "Now"
-        }, None, 0)])
+        return "No photo", 404
+
+    path = thumbnails.path(id, request.args.get("size", 64, type=int))
+    if path is None:
+        return "No photo", 404
+    # conditional: answers If-None-Match with 304 Not Modified. send_file
+    # resolves relative paths against the app folder, not the working directory
+    return send_file(
+        os.path.abspath(path),
+        mimetype="image/jpeg",
+        etag=thumbnails.etag(path),
+        conditional=True,
+        max_age=config.THUMBNAIL_MAX_AGE,
+    )
 
-    if request.method == "POST":
-        if request.form.get("button_student") == "VALUE1":
-            already_marked_id_student.clear()
-            return redirect(url_for("admin_attendance_list"))
-        else:
-            request.form.get("button_admin") == "VALUE2"
-            already_marked_id_admin.clear()
-            return redirect(url_for("admin_attendance_list"))
-    else:
-        unique_id_admin = list(set(already_marked_id_admin))
-        student_info = []
-        for i in unique_id_admin:
-            student_info.append(dataset(i))
-        return render_template("admin_attendance_list.html", data=student_info)
 
+@app.route("/admin/group_photo", methods=["POST"])
+@needs_services
+def group_photo():
+    """Mark everyone recognized in one or more uploaded class photos."""
+    if MOCK_MODE:
+        return {"recognized": [], "already_marked": [], "unknown": []}
+
+    photos = []
+    for file in request.files.getlist("photos"):
+        img = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return f"Could not read {file.filename}", 400
+        photos.append((file.filename, img))
+    if not photos:
+        return "No photos uploaded", 400
+
+    with STAGE_SECONDS.time(camera="photo", stage="recognize"):
+        results = recognize_photos(
+            gallery,
+            [img for _, img in photos],
+            config.GROUP_PHOTO_MAX_SIDE,
+            config.GROUP_PHOTO_UPSAMPLE,
+            request.form.get("partition") or None,
+        )
 
+    unknown = []
+    best = {}
+    for (filename, _), faces in zip(photos, results):
+        for face in faces:
+            entry = {
+                "photo": filename,
+                "location": list(face.location),
+                "distance": round(face.match.distance, 4),
+            }
+            if not face.match.accepted:
+                unknown.append(entry)
+                continue
+            # a student in several photos is counted once, by their best match
+            entry["id"] = face.match.id
+            if face.match.id not in best or entry["distance"] < best[face.match.id]["distance"]:
+                best[face.match.id] = entry
+    FACES.inc(sum(len(faces) for faces in results), camera="photo")
+    MATCHES.inc(len(best), camera="photo")
+    UNKNOWNS.inc(len(unknown), camera="photo")
+
+    marked = []
+    records = students.get_many(best)
+    for id, entry in best.items():
+        studentInfo = records.get(id)
+        if studentInfo is None:
+            unknown.append(entry)
+            continue
+        entry["name"] = studentInfo.get("name")
+        marked.append((id, studentInfo))
+
+    # one batch for the whole room, sent straight away; whoever was marked
+    # first by a kiosk or another worker is left out of it
+    counted = set(mark_attendance_many(marked, camera="photo", flush=True))
+    recognized = [best[id] for id, _ in marked if id in counted]
+    already_marked = [best[id] for id, _ in marked if id not in counted]
+    return {"recognized": recognized, "already_marked": already_marked, "unknown": unknown}
 
-#########################################################################################################################
 
-def add_image_database():
+@app.route("/admin/admin_attendance_list", methods=["GET", "POST"])
+@needs_services
+def admin_attendance_list():
     if MOCK_MODE:
-        return [], []
-        
-    folderPath = "static/Files/Images"
-    imgPathList = os.listdir(folderPath)
-    imgList = []
-    studentIDs = []
-
-    for path in imgPathList:
-        imgList.append(cv2.imread(os.path.join(folderPath, path)))
-        studentIDs.append(os.path.splitext(path)[0])
+        return render_template("admin_attendance_list.html", data=[{
+            "id": "123", "name": "Jyoti (Mock)", "major": "CS", "camera": "0", "marked_at": "Now"
+        }], session=None)
 
-        fileName = f"{folderPath}/{path}"
-        bucket = storage.bucket("cognito-2312c.firebasestorage.app")
-        blob = bucket.blob(fileName)
-        blob.upload_from_filename(fileName)
+    if request.method == "POST":
+        # "Clear List" closes the session; the marks stay in the ledger
+        ledger.new_session()
+        return redirect(url_for("admin_attendance_list"))
 
-    return studentIDs, imgList
+    session = ledger.current()
+    data = ledger.marks(session["id"])
+    # current names and majors; the ledger's copy is what they were when marked
+    current = students.get_many(mark["id"] for mark in data)
+    for mark in data:
+        info = current.get(mark["id"], {})
+        mark["name"] = info.get("name", mark["name"])
+        mark["major"] = info.get("major", mark["major"])
+        mark["marked_at"] = datetime.fromtimestamp(mark["marked_at"]).strftime("%H:%M:%S")
+    session["started_at"] = datetime.fromtimestamp(session["started_at"]).strftime("%Y-%m-%d %H:%M")
+    return render_template("admin_attendance_list.html", data=data, session=session)
 
 
-def findEncodings(images):
-    if MOCK_MODE:
-        return []
-        
-    encodeList = []
 
-    for img in images:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encode = face_recognition.face_encodings(img)[0]
-        encodeList.append(encode)
+#########################################################################################################################
 
-    return encodeList
+def upload_image(fileName):
+    with FIREBASE_SECONDS.time(op="photo_upload"):
+        photo_sync.upload(fileName)
 
 
 @app.route("/admin/add_user", methods=["GET", "POST"])
+@needs_services
 def add_user():
     if MOCK_MODE:
          return render_template("add_user.html")
-         
+
+    if request.method != "POST":
+        return render_template("add_user.html")
+
     id = request.form.get("id", False)
     name = request.form.get("name", False)
     password = request.form.get("password", False)
@@ -538,42 +832,82 @@ def add_user():
     total_attendance = int(total_attendance)
      
 
-    if request.method == "POST":
-        image = request.files["image"]
-        filename = f"{'static/Files/Images'}/{id}.jpg"
-        image.save(os.path.join(filename))
-
-    studentIDs, imgList = add_image_database()
-
-    encodeListKnown = findEncodings(imgList)
-
-    encodeListKnownWithIds = [encodeListKnown, studentIDs]
+    if not id:
+        return "Missing student ID", 400
+
+    image = request.files["image"]
+    filename = f"{'static/Files/Images'}/{id}.jpg"
+    # the upload waits under a hidden name until it is known to show a face,
+    # so a bad re-enrollment leaves the current photo alone
+    upload = f"{'static/Files/Images'}/.{id}.{uuid.uuid4().hex}.jpg"
+    image.save(upload)
+
+    record = {
+        "id": id,
+        "name": name,
+        "password": password,
+        "major": major,
+        "total_attendance": total_attendance,
+        "last_attendance_time": last_attendance_datetime,
+    }
+    # encoding and the uploads run on the enrollment pool; the browser polls
+    # /admin/jobs/<job id> for progress
+    job = enrollments.submit(
+        lambda job: enroll(job, id, upload, filename, record), subject=id, stage="stored"
+    )
+    return render_template("add_user.html", job=job.status()), 202
 
-    file = open("EncodeFile.p", "wb")
-    pickle.dump(encodeListKnownWithIds, file)
-    file.close()
 
-    if id:
-        add_student = db.reference(f"Students")
+def enroll(job, id, upload, filename, record):
+    try:
+        encoding = gallery.encode(upload)
+        if encoding is None:
+            raise ValueError("No face found in the uploaded image")
+    except Exception:
+        os.remove(upload)
+        raise
+    os.replace(upload, filename)
+    job.advance("encoded")
+
+    gallery.add(id, filename, encoding)
+    thumbnails.generate(id)
+    job.advance("indexed")
+
+    upload_image(filename)
+    with FIREBASE_SECONDS.time(op="student_set"):
+        db.reference("Students").child(id).set(record)
+    students.set(id, record)
+    forget_student(id)
+    job.advance("synced")
+
+
+@app.route("/admin/sync_photos", methods=["POST"])
+@needs_services
+def sync_photos():
+    if MOCK_MODE:
+        return {"uploaded": [], "deleted": [], "seconds": 0}
+    # ?delete=1 also removes bucket photos that have no local original
+    delete = request.args.get("delete") == "1"
+    with FIREBASE_SECONDS.time(op="photo_sync"):
+        return photo_sync.sync(delete=delete)
 
-        add_student.child(id).set(
-            {
-                "id": id,
-                "name": name,
-                "password": password,
-                "major": major,
-                "total_attendance": total_attendance,
-                "last_attendance_time": last_attendance_datetime,
-            }
-        )
 
-    return render_template("add_user.html")
+@app.route("/admin/jobs/<job_id>")
+@needs_services
+def job_status(job_id):
+    if MOCK_MODE:
+        return "Unknown job", 404
+    job = enrollments.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    return job.status()
 
 
 #########################################################################################################################
 
 
 @app.route("/admin/edit_user", methods=["POST", "GET"])
+@needs_services
 def edit_user():
     if MOCK_MODE:
          return render_template("edit_user.html", data={
@@ -598,6 +932,7 @@ def edit_user():
 
 
 @app.route("/admin/save_changes", methods=["POST", "GET"])
+@needs_services
 def save_changes():
     if MOCK_MODE:
         return "Data received successfully! (MOCKED)"
@@ -614,15 +949,18 @@ def save_changes():
 
     update_student = db.reference(f"Students")
 
-    update_student.child(dic_data["id"]).update(
-        {
-            "id": dic_data["id"],
-            "name": dic_data["name"],
-            "major": dic_data["major"],
-            "total_attendance": dic_data["total_attendance"],
-            "last_attendance_time": dic_data["last_attendance_time"],
-        }
-    )
+    fields = {
+        "id": dic_data["id"],
+        "name": dic_data["name"],
+        "major": dic_data["major"],
+        "total_attendance": dic_data["total_attendance"],
+        "last_attendance_time": dic_data["last_attendance_time"],
+    }
+    with FIREBASE_SECONDS.time(op="student_update"):
+        update_student.child(dic_data["id"]).update(fields)
+    students.update(dic_data["id"], fields)
+
+    forget_student(dic_data["id"])
 
     return "Data received successfully!"
 
@@ -637,14 +975,14 @@ def delete_image(student_id):
 
     os.remove(filepath)
 
-    bucket = storage.bucket()
-    blob = bucket.blob(filepath)
-    blob.delete()
+    with FIREBASE_SECONDS.time(op="photo_delete"):
+        photo_sync.delete(filepath)
 
     return "Successful"
 
 
 @app.route("/admin/delete_user", methods=["POST", "GET"])
+@needs_services
 def delete_user():
     if MOCK_MODE: return "Successful"
     
@@ -653,24 +991,23 @@ def delete_user():
     student_id = json.loads(content.decode("utf-8"))
 
     delete_student = db.reference(f"Students")
-    delete_student.child(student_id).delete()
+    with FIREBASE_SECONDS.time(op="student_delete"):
+        delete_student.child(student_id).delete()
+    students.delete(student_id)
+    forget_student(student_id)
 
     delete_image(student_id)
+    thumbnails.remove(student_id)
 
-    studentIDs, imgList = add_image_database()
-
-    encodeListKnown = findEncodings(imgList)
-
-    encodeListKnownWithIds = [encodeListKnown, studentIDs]
-
-    file = open("EncodeFile.p", "wb")
-    pickle.dump(encodeListKnownWithIds, file)
-    file.close()
+    gallery.remove(student_id)
 
     return "Successful"
 
 
 #########################################################################################################################
+if SERVER:
+    threading.Thread(target=_run_warm_up, name="warm-up", daemon=True).start()
+
 if __name__ == "__main__":
     
     app.run(debug=True)
@@ -0,0 +1,204 @@
+import glob
+import itertools
+import json
+import os
+import threading
+import time
+
+from state import lock_file
+
+WAL_FILE = "attendance.wal"
+
+
+class AttendanceQueue:
+    """Write-behind queue for attendance marks.
+
+    ``put`` appends the mark to a local write-ahead log, fsyncs it and
+    returns, so the video loop never waits on the network. A background
+    thread coalesces pending marks into one multi-path update per batch
+    (later marks for the same field win) and hands it to ``write``. Failed
+    batches are retried with exponential backoff. Marks still in the log
+    when the process stops are replayed on the next start.
+
+    Log lines are ``{"seq", "id", "fields"}`` for a mark and ``{"ack"}`` once
+    every mark up to that sequence number is in the database.
+
+    Each worker process logs to its own file: ``path`` itself, or
+    ``path.1``, ``path.2``... when another live worker has it locked. On
+    start a queue also takes over the marks left in slots whose workers
+    have gone, so none are lost when fewer workers come back.
+    """
+
+    def __init__(self, write, path=WAL_FILE, batch_size=200, interval=1.0, max_backoff=60.0):
+        self.write = write
+        self.base = path
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.pending = []
+        self.seq = 0
+
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_latency = 0.0
+        self.last_error = None
+
+        self.log = self._claim()
+        self._replay()
+        self._adopt()
+        self.thread = threading.Thread(target=self._run, name="attendance-flush", daemon=True)
+        self.thread.start()
+
+    def put(self, student_id, fields):
+        self.put_many([(student_id, fields)])
+
+    def put_many(self, marks, flush=False):
+        """Log several ``(student_id, fields)`` marks with a single fsync.
+
+        With ``flush`` the batch is sent now rather than at the next interval.
+        """
+        if not marks:
+            return
+        with self.lock:
+            entries = []
+            for student_id, fields in marks:
+                self.seq += 1
+                entries.append({"seq": self.seq, "id": student_id, "fields": fields})
+            self._append(*entries)
+            self.pending.extend(entries)
+            full = len(self.pending) >= self.batch_size
+        if full or flush:
+            self.wake.set()
+
+    def stats(self):
+        with self.lock:
+            depth = len(self.pending)
+        return {
+            "depth": depth,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_latency * 1000, 1),
+            "last_error": self.last_error,
+            "log": self.path,
+        }
+
+    def close(self, timeout=5.0):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        with self.lock:
+            self.log.close()
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            self.wake.wait(backoff or self.interval)
+            self.wake.clear()
+            try:
+                while self.flush():
+                    pass
+                backoff = 0.0
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                backoff = min(max(backoff * 2, 1.0), self.max_backoff)
+                if self.stopped.is_set():
+                    return
+                continue
+            if self.stopped.is_set():
+                return
+
+    def flush(self):
+        """Send one batch; returns False once nothing is left to send."""
+        with self.lock:
+            batch = self.pending[: self.batch_size]
+        if not batch:
+            return False
+
+        updates = {}
+        for entry in batch:
+            for field, value in entry["fields"].items():
+                updates[f"Students/{entry['id']}/{field}"] = value
+
+        start = time.perf_counter()
+        self.write(updates)
+        self.last_latency = time.perf_counter() - start
+
+        with self.lock:
+            del self.pending[: len(batch)]
+            self._append({"ack": batch[-1]["seq"]})
+            if not self.pending:
+                # everything is in the database; start the log afresh
+                self.log.seek(0)
+                self.log.truncate()
+        self.flushed += len(batch)
+        self.batches += 1
+        self.last_error = None
+        return True
+
+    def _append(self, *records):
+        self.log.write("".join(json.dumps(record) + "\n" for record in records))
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def _claim(self):
+        # the first slot no live worker holds; the lock lasts as long as the log is open
+        for n in itertools.count():
+            path = self.base if n == 0 else f"{self.base}.{n}"
+            log = open(path, "a", encoding="utf-8")
+            if lock_file(log, blocking=False):
+                self.path = path
+                return log
+            log.close()
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as file:
+            self.pending, self.seq = _unacked(file)
+
+    def _adopt(self):
+        slots = [self.base] + [
+            path
+            for path in glob.glob(glob.escape(self.base) + ".*")
+            if path.rsplit(".", 1)[1].isdigit()
+        ]
+        for path in slots:
+            if path == self.path:
+                continue
+            with open(path, "r+", encoding="utf-8") as file:
+                if not lock_file(file, blocking=False):
+                    continue
+                entries, _ = _unacked(file)
+                if entries:
+                    for entry in entries:
+                        self.seq += 1
+                        entry["seq"] = self.seq
+                    self._append(*entries)
+                    self.pending.extend(entries)
+                # the marks are safe in our log now
+                file.seek(0)
+                file.truncate()
+
+
+def _unacked(file):
+    """The marks in a log that were never acknowledged, and its last sequence number."""
+    acked = 0
+    entries = []
+    for line in file:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # torn last line from a crash mid-write
+            continue
+        if "ack" in record:
+            acked = max(acked, record["ack"])
+        else:
+            entries.append(record)
+    pending = [entry for entry in entries if entry["seq"] > acked]
+    return pending, max([acked] + [entry["seq"] for entry in entries])
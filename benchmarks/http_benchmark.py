@@ -0,0 +1,275 @@
+"""Load-test the Flask endpoints with concurrent clients and report as JSON.
+
+By default the app is started in this process in mock mode (no camera or
+Firebase) on a free port; --url points the clients at a running server
+instead. Run from the repository root:
+
+    python -m benchmarks.http_benchmark --concurrency 16 --duration 10
+    python -m benchmarks.http_benchmark --output http.json --max-error-rate 0 --max-p95-ms 200
+    python -m benchmarks.http_benchmark --url http://127.0.0.1:5000 --no-writes
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.report import commit, percentiles
+
+# name, method, path, body, weight; POST bodies are JSON like the admin pages send
+REQUESTS = [
+    ("index", "GET", "/", None, 2),
+    ("admin", "GET", "/admin", None, 4),
+    ("attendance_list", "GET", "/admin/admin_attendance_list", None, 4),
+    ("add_user", "GET", "/admin/add_user", None, 1),
+    (
+        "save_changes",
+        "POST",
+        "/admin/save_changes",
+        {
+            "id": "000000",
+            "name": "Load Test",
+            "major": "AI Engineering",
+            "total_attendance": "5",
+            "year": "2",
+            "starting_year": "2023",
+            "standing": "G",
+            "last_attendance_time": "2024-01-01 00:00:00",
+        },
+        2,
+    ),
+    ("delete_user", "POST", "/admin/delete_user", "000000", 1),
+]
+WRITES = {"save_changes", "delete_user"}
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def add(self, name, seconds, status):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            self.statuses.setdefault(name, {})
+            self.statuses[name][status] = self.statuses[name].get(status, 0) + 1
+            if not (isinstance(status, int) and status < 400):
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def request(base, method, path, body=None, timeout=10.0):
+    """Send one request on a fresh connection; returns the status and the body."""
+    conn = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=timeout)
+    try:
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def client(base, mix, deadline, seed, results, timeout):
+    rng = random.Random(seed)
+    names, weights = zip(*[(entry, entry[4]) for entry in mix])
+    while time.perf_counter() < deadline:
+        name, method, path, body, _ = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status, _ = request(base, method, path, body, timeout)
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+        results.add(name, time.perf_counter() - start, status)
+
+
+def viewer(base, path, frames, deadline, results, streams, timeout):
+    """Watch the MJPEG stream, reconnecting after every ``frames`` frames."""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection(base.hostname, base.port or 80, timeout=timeout)
+        got = 0
+        first = None
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            if response.status != 200:
+                results.add("video", time.perf_counter() - start, response.status)
+                time.sleep(0.1)
+                continue
+            while got < frames and time.perf_counter() < deadline:
+                line = response.fp.readline()
+                if not line:
+                    break
+                if line.startswith(b"--frame"):
+                    got += 1
+                    if first is None:
+                        first = time.perf_counter() - start
+            status = 200 if got else "NoFrames"
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+        finally:
+            conn.close()
+        seconds = time.perf_counter() - start
+        # a stream's latency is the time to its first frame
+        results.add("video", first if first is not None else seconds, status)
+        with results.lock:
+            streams.append((got, seconds))
+
+
+def start_server():
+    """Serve the app in mock mode on a free local port; returns the server."""
+    os.environ["MOCK_MODE"] = "1"
+    from werkzeug.serving import make_server
+
+    import app
+
+    # the per-request access log would swamp the report
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="http-benchmark", daemon=True).start()
+    return server
+
+
+def run(args):
+    server = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        server = start_server()
+        url = f"http://127.0.0.1:{server.server_port}"
+    base = urlsplit(url)
+
+    mix = [entry for entry in REQUESTS if args.writes or entry[0] not in WRITES]
+    if args.only:
+        mix = [entry for entry in mix if entry[0] in args.only]
+
+    # one untimed pass so first-request costs (template compiles) are not counted
+    for name, method, path, body, _ in mix:
+        request(base, method, path, body, args.timeout)
+
+    results = Results()
+    streams = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(
+            target=client, args=(base, mix, deadline, args.seed + i, results, args.timeout)
+        )
+        for i in range(args.concurrency if mix else 0)
+    ]
+    threads += [
+        threading.Thread(
+            target=viewer,
+            args=(base, args.video_path, args.video_frames, deadline, results, streams, args.timeout),
+        )
+        for _ in range(args.video_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    endpoints = {}
+    for name, latencies in sorted(results.latencies.items()):
+        errors = results.errors.get(name, 0)
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4),
+            "rps": round(len(latencies) / wall, 2),
+            "latency_ms": percentiles(latencies),
+            "statuses": {str(status): count for status, count in results.statuses[name].items()},
+        }
+    if "video" in endpoints:
+        frames = sum(got for got, _ in streams)
+        endpoints["video"]["frames"] = frames
+        endpoints["video"]["fps_per_stream"] = round(
+            frames / sum(seconds for _, seconds in streams), 2
+        ) if streams else 0.0
+
+    # streams are reported on their own; the totals cover page requests
+    everything = [
+        seconds
+        for name, latencies in results.latencies.items()
+        if name != "video"
+        for seconds in latencies
+    ]
+    total = len(everything)
+    errors = sum(count for name, count in results.errors.items() if name != "video")
+    return {
+        "url": url,
+        "mock": server is not None,
+        "commit": commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "video_clients": args.video_clients,
+            "video_frames": args.video_frames,
+            "writes": args.writes,
+            "seed": args.seed,
+        },
+        "wall_seconds": round(wall, 3),
+        "requests": total,
+        "rps": round(total / wall, 2),
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "latency_ms": percentiles(everything),
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="test a running server instead of an in-process mock app")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending page requests")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--video-clients", type=int, default=2, help="clients watching /video")
+    parser.add_argument("--video-frames", type=int, default=20, help="frames per stream before reconnecting")
+    parser.add_argument("--video-path", default="/video")
+    parser.add_argument(
+        "--no-writes",
+        dest="writes",
+        action="store_false",
+        help="leave out save_changes and delete_user (use against a real database)",
+    )
+    parser.add_argument("--only", nargs="+", help="request names to send, e.g. admin index")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--max-error-rate", type=float, help="exit 1 if the error rate is above this")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if the overall p95 latency is above this")
+    args = parser.parse_args()
+
+    result = run(args)
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+    failed = []
+    if args.max_error_rate is not None and result["error_rate"] > args.max_error_rate:
+        failed.append(f"error rate {result['error_rate']} > {args.max_error_rate}")
+    if args.max_p95_ms is not None and result["latency_ms"].get("p95", 0) > args.max_p95_ms:
+        failed.append(f"p95 {result['latency_ms']['p95']} ms > {args.max_p95_ms} ms")
+    if failed:
+        print("FAILED: " + "; ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
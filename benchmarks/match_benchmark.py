@@ -0,0 +1,77 @@
+"""Per-frame face matching cost against galleries of increasing size.
+
+Compares the old ``compare_faces`` + ``face_distance`` + ``argmin`` loop with
+``FaceMatcher``. Run from the repository root:
+
+    python -m benchmarks.match_benchmark --faces 4
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from matcher import TOLERANCE, FaceMatcher
+
+SIZES = [100, 1000, 10000, 100000]
+
+
+def legacy_match(known, faces):
+    # what generate_frame used to do: face_recognition.compare_faces and
+    # face_recognition.face_distance both compute the same norm per face
+    results = []
+    for face in faces:
+        matches = list(np.linalg.norm(known - face, axis=1) <= TOLERANCE)
+        faceDistance = np.linalg.norm(known - face, axis=1)
+        matchIndex = np.argmin(faceDistance)
+        results.append((matchIndex, matches[matchIndex]))
+    return results
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--faces", type=int, default=1, help="faces per frame")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for size in args.sizes:
+        known = rng.normal(0, 0.1, (size, 128))
+        faces = known[rng.integers(0, size, args.faces)] + rng.normal(0, 0.01, (args.faces, 128))
+        known_list = list(known)
+        matcher = FaceMatcher([str(i) for i in range(size)], known)
+
+        rows.append(
+            {
+                "students": size,
+                "faces": args.faces,
+                "legacy_ms": timeit(lambda: legacy_match(known_list, faces), args.repeat),
+                "matcher_ms": timeit(lambda: matcher.match(faces), args.repeat),
+            }
+        )
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'students':>10} {'faces':>6} {'legacy ms':>12} {'matcher ms':>12} {'speedup':>8}")
+    for row in rows:
+        print(
+            f"{row['students']:>10} {row['faces']:>6} {row['legacy_ms']:>12.3f} "
+            f"{row['matcher_ms']:>12.3f} {row['legacy_ms'] / row['matcher_ms']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Replay recorded frames through the kiosk recognition loop and time it.
+
+Runs the same FaceRecognizer -> Kiosk -> JPEG steps as a live camera, one
+frame after another, against a local gallery file and a stand-in database,
+so no webcam or Firebase is needed. Run from the repository root:
+
+    python -m benchmarks.replay_benchmark clip.mp4 --output bench.json
+    python -m benchmarks.replay_benchmark frames/ --detect-interval 5
+    python -m benchmarks.replay_benchmark clip.mp4 --redraw
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import face_recognition
+import numpy as np
+
+from benchmarks.report import commit, percentiles
+from cameras import FRAME_SIZE
+from gallery import ENCODE_FILE, IMAGE_FOLDER, FaceGallery
+from kiosk import Kiosk
+from matcher import FaceMatcher
+from recognition import FaceRecognizer, MotionGate
+
+STAGES = ["detect", "encode", "match", "composite", "jpeg"]
+
+
+class StageTimer:
+    def __init__(self):
+        self.frame = defaultdict(float)
+        self.totals = defaultdict(list)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.frame[stage] += time.perf_counter() - start
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            with self.time(stage):
+                return original(*args, **kwargs)
+
+        setattr(owner, name, timed)
+
+    def end_frame(self):
+        for stage in STAGES:
+            self.totals[stage].append(self.frame.pop(stage, 0.0))
+
+
+class StandInDatabase:
+    """Student records for every gallery ID, photos from static/Files/Images."""
+
+    def __init__(self, ids):
+        self.records = {
+            student_id: {
+                "id": student_id,
+                "name": student_id,
+                "major": "Benchmark",
+                "total_attendance": 0,
+                "standing": "G",
+            }
+            for student_id in ids
+        }
+        self.photos = {}
+        self.last_marked = {}
+        self.marks = 0
+
+    def lookup(self, student_id):
+        info = self.records.get(student_id)
+        if info is None:
+            return None
+        if student_id not in self.photos:
+            img = cv2.imread(os.path.join(IMAGE_FOLDER, f"{student_id}.jpg"))
+            self.photos[student_id] = img if img is not None else np.zeros((216, 216, 3), np.uint8)
+        marked = self.last_marked.get(student_id)
+        return info, self.photos[student_id], None if marked is None else time.time() - marked
+
+    def mark(self, student_id, info):
+        info["total_attendance"] += 1
+        self.last_marked[student_id] = time.time()
+        self.marks += 1
+        return True
+
+
+def read_frames(source, limit):
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+        frames = (cv2.imread(path) for path in paths)
+    else:
+        capture = cv2.VideoCapture(source)
+
+        def frames_from_capture():
+            while True:
+                success, img = capture.read()
+                if not success:
+                    break
+                yield img
+            capture.release()
+
+        frames = frames_from_capture()
+
+    count = 0
+    for img in frames:
+        if img is None:
+            continue
+        if (img.shape[1], img.shape[0]) != FRAME_SIZE:
+            img = cv2.resize(img, FRAME_SIZE)
+        yield img
+        count += 1
+        if limit and count >= limit:
+            return
+
+
+def run(args):
+    timer = StageTimer()
+    timer.wrap(face_recognition, "face_locations", "detect")
+    timer.wrap(face_recognition, "face_encodings", "encode")
+    timer.wrap(FaceMatcher, "match", "match")
+
+    gallery = FaceGallery(args.gallery, cache_path=None, legacy_path=None)
+    database = StandInDatabase(gallery.ids)
+    kiosk = Kiosk(database.lookup, database.mark, lambda student_id, info: None)
+    gate = None
+    if args.motion_area > 0:
+        gate = MotionGate(args.motion_threshold, args.motion_area, args.motion_refresh)
+    recognizer = FaceRecognizer(
+        gallery, detect_interval=args.detect_interval, track_ttl=args.track_ttl, gate=gate
+    )
+
+    latencies = []
+    faces_seen = matched = 0
+    started = time.perf_counter()
+    for index, img in enumerate(read_frames(args.source, args.limit)):
+        start = time.perf_counter()
+        faces = recognizer(img)
+        kiosk.update(faces)
+        with timer.time("composite"):
+            if args.redraw:
+                kiosk.invalidate()
+            canvas = kiosk.render(img)
+        with timer.time("jpeg"):
+            cv2.imencode(".jpeg", canvas)
+        elapsed = time.perf_counter() - start
+
+        timer.end_frame()
+        if index < args.warmup:
+            continue
+        latencies.append(elapsed)
+        faces_seen += len(faces)
+        matched += sum(1 for face in faces if face.match.accepted)
+    wall = time.perf_counter() - started
+
+    measured = slice(args.warmup, None)
+    return {
+        "source": args.source,
+        "commit": commit(),
+        "config": {
+            "gallery": args.gallery,
+            "students": len(gallery),
+            "detect_interval": args.detect_interval,
+            "track_ttl": args.track_ttl,
+            "motion_area": args.motion_area,
+            "motion_threshold": args.motion_threshold,
+            "warmup": args.warmup,
+            "redraw": args.redraw,
+        },
+        "frames": len(latencies),
+        "faces": faces_seen,
+        "matched": matched,
+        "attendance_marks": database.marks,
+        "fps": round(len(latencies) / sum(latencies), 2) if latencies else 0.0,
+        "wall_seconds": round(wall, 3),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {
+            stage: percentiles(timer.totals[stage][measured]) for stage in STAGES
+        },
+        "recognizer": recognizer.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--gallery", default=ENCODE_FILE)
+    parser.add_argument("--detect-interval", type=int, default=1)
+    parser.add_argument("--track-ttl", type=float, default=1.0)
+    parser.add_argument(
+        "--motion-area", type=float, default=0.0, help="enable the motion gate (0 = off)"
+    )
+    parser.add_argument("--motion-threshold", type=int, default=15)
+    parser.add_argument("--motion-refresh", type=float, default=5.0)
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many frames")
+    parser.add_argument("--warmup", type=int, default=5, help="frames left out of the results")
+    parser.add_argument(
+        "--redraw",
+        action="store_true",
+        help="repaint the whole kiosk screen every frame, as before panels were cached",
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Helpers shared by the benchmarks' JSON reports."""
+import subprocess
+
+import numpy as np
+
+
+def commit():
+    """Short hash of the checked-out commit, or None outside a git tree."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentiles(samples):
+    """Mean, p50/p95/p99 (linearly interpolated) and max of seconds, in ms."""
+    samples = np.asarray(samples) * 1000
+    if not len(samples):
+        return {}
+    return {
+        "mean": round(float(samples.mean()), 3),
+        "p50": round(float(np.percentile(samples, 50)), 3),
+        "p95": round(float(np.percentile(samples, 95)), 3),
+        "p99": round(float(np.percentile(samples, 99)), 3),
+        "max": round(float(samples.max()), 3),
+    }
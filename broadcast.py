@@ -0,0 +1,79 @@
+import threading
+
+from streaming import DEFAULT_QUALITY, stream
+
+
+class Broadcaster:
+    """One camera pipeline shared by every client watching that camera.
+
+    The pipeline is started by the first subscriber and stopped once the
+    last one has been gone for ``idle_timeout`` seconds, so a page reload
+    does not reopen the device. The pipeline publishes ``streaming.Frame``
+    objects; subscribers each read the newest one at their own frame rate and
+    JPEG quality, so a slow client skips frames and never holds up the
+    producer or the other clients.
+
+    ``factory`` returns ``(pipeline, stats)`` where ``stats`` is a callable
+    returning extra counters to report alongside the pipeline's own.
+    """
+
+    def __init__(self, factory, idle_timeout=5.0):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.pipeline = None
+        self.extra_stats = None
+        self.viewers = 0
+        self._idle = None
+
+    def subscribe(self, fps=0, quality=DEFAULT_QUALITY):
+        pipeline = self._join()
+        try:
+            yield from stream(pipeline.output, fps, quality)
+        finally:
+            self._leave()
+
+    def stats(self):
+        with self.lock:
+            pipeline, extra_stats = self.pipeline, self.extra_stats
+            stats = {"viewers": self.viewers, "running": pipeline is not None}
+        if pipeline is not None:
+            stats.update(pipeline.stats())
+            stats.update(extra_stats())
+        return stats
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def _join(self):
+        with self.lock:
+            if self._idle is not None:
+                self._idle.cancel()
+                self._idle = None
+            if self.pipeline is not None and self.pipeline.output.closed:
+                self._stop()
+            if self.pipeline is None:
+                pipeline, self.extra_stats = self.factory()
+                self.pipeline = pipeline.start()
+            self.viewers += 1
+            return self.pipeline
+
+    def _leave(self):
+        with self.lock:
+            self.viewers -= 1
+            if self.viewers == 0 and self.pipeline is not None:
+                self._idle = threading.Timer(self.idle_timeout, self._stop_if_idle)
+                self._idle.daemon = True
+                self._idle.start()
+
+    def _stop_if_idle(self):
+        with self.lock:
+            if self.viewers == 0:
+                self._stop()
+
+    def _stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.pipeline = None
+        self.extra_stats = None
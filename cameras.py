@@ -0,0 +1,153 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+FRAME_SIZE = (640, 480)
+
+
+class CameraBusy(RuntimeError):
+    pass
+
+
+class CameraSource:
+    """``cv2.VideoCapture`` that always yields kiosk-sized frames.
+
+    Video files are played back at their own frame rate instead of as fast
+    as they decode. With a ``state.Lease`` the device is only opened while
+    the lease is ours; it is renewed as frames are read, reading stops if it
+    is lost and releasing the camera releases the lease. ``on_release`` is
+    called once the camera is released.
+    """
+
+    def __init__(self, source, lease=None, on_release=None):
+        if lease is not None and not lease.acquire():
+            holder = lease.state.holder(lease.name)
+            raise CameraBusy(f"{lease.name} is held by {holder}")
+        self.lease = lease
+        self.on_release = on_release
+        self.capture = cv2.VideoCapture(source)
+        self.interval = 0.0
+        if isinstance(source, int):
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_SIZE[0])
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_SIZE[1])
+        elif "://" not in source:
+            fps = self.capture.get(cv2.CAP_PROP_FPS)
+            self.interval = 1 / fps if fps and fps > 0 else 1 / 30
+        self._next = time.monotonic()
+
+    def read(self):
+        if self.lease is not None and not self.lease.keep():
+            return False, None
+        if self.interval:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self.interval, time.monotonic())
+
+        success, img = self.capture.read()
+        if success and (img.shape[1], img.shape[0]) != FRAME_SIZE:
+            img = cv2.resize(img, FRAME_SIZE)
+        return success, img
+
+    def release(self):
+        self.capture.release()
+        if self.lease is not None:
+            self.lease.release()
+        if self.on_release is not None:
+            self.on_release()
+
+
+_recognizer = None
+
+
+def _init_worker(gallery_path, partitions_path, detect_interval, track_ttl, motion, fallback):
+    global _recognizer
+    from gallery import FaceGallery
+    from recognition import FaceRecognizer, MotionGate
+
+    # the gallery file is memory-mapped read-only, so every worker shares
+    # the same pages; enrollments show up through reload_if_changed()
+    gallery = FaceGallery(
+        gallery_path, cache_path=None, legacy_path=None, partitions_path=partitions_path
+    )
+    _recognizer = FaceRecognizer(
+        gallery,
+        detect_interval=detect_interval,
+        track_ttl=track_ttl,
+        gate=MotionGate(**motion) if motion is not None else None,
+        fallback=fallback,
+    )
+
+
+def _recognize(img, partition):
+    _recognizer.partition = partition
+    faces = _recognizer(img)
+    return faces, _recognizer.stats(), _recognizer.timings
+
+
+class RecognitionWorker:
+    """Runs one camera's FaceRecognizer in its own worker process.
+
+    Each camera gets a single-process pool so cameras scale across cores and
+    the detector's tracking state stays with its camera. The process starts
+    on first use, is replaced if it dies and is stopped by ``shutdown``. ``motion`` holds ``MotionGate``
+    arguments; ``None`` runs recognition on every frame. ``partition`` is the
+    gallery partition the camera matches against and may be changed at any
+    time; ``None`` is the whole gallery.
+    """
+
+    def __init__(
+        self,
+        gallery_path,
+        partitions_path=None,
+        detect_interval=1,
+        track_ttl=1.0,
+        motion=None,
+        partition=None,
+        fallback=True,
+    ):
+        self.initargs = (gallery_path, partitions_path, detect_interval, track_ttl, motion, fallback)
+        self.partition = partition
+        self.lock = threading.Lock()
+        self.executor = None
+        self.last_stats = {}
+        self.timings = {}
+        self.restarts = 0
+
+    def __call__(self, img):
+        with self.lock:
+            if self.executor is None:
+                # spawned, not forked: the server process has Flask, listener and
+                # flusher threads whose locks a forked child could inherit held
+                self.executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=self.initargs,
+                )
+            executor = self.executor
+        try:
+            future = executor.submit(_recognize, img, self.partition)
+            faces, self.last_stats, self.timings = future.result()
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            self.timings = {}
+            self.restarts += 1
+            return []
+        return faces
+
+    def stats(self):
+        return dict(self.last_stats, restarts=self.restarts, partition=self.partition)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,100 @@
+import os
+
+# read after app.py has called load_dotenv(), so values can live in .env
+
+# the recognition stack loads in the background at startup; pages that need
+# it wait this many seconds for it before answering 503
+WARMUP_WAIT = float(os.getenv("WARMUP_WAIT", 10))
+
+# recognition: run full face detection every DETECT_INTERVAL frames and follow
+# the boxes in between; 1 disables tracking. A track that no detection has
+# confirmed for TRACK_TTL seconds is dropped.
+DETECT_INTERVAL = int(os.getenv("DETECT_INTERVAL", 5))
+TRACK_TTL = float(os.getenv("TRACK_TTL", 1.0))
+
+# motion gate in front of face detection: a frame is skipped (and the last
+# faces reused) unless MOTION_AREA of it changed by more than MOTION_THRESHOLD
+# grey levels; one frame every MOTION_REFRESH seconds always goes through.
+# MOTION_AREA=0 turns the gate off.
+MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", 15))
+MOTION_AREA = float(os.getenv("MOTION_AREA", 0.005))
+MOTION_REFRESH = float(os.getenv("MOTION_REFRESH", 5.0))
+
+# student records are read from a local SQLite replica of the Students node,
+# kept current by a database listener and fully re-read every
+# STUDENT_REPLICA_RECONCILE seconds
+STUDENT_REPLICA_DB = os.getenv("STUDENT_REPLICA_DB", "students.db")
+STUDENT_REPLICA_RECONCILE = float(os.getenv("STUDENT_REPLICA_RECONCILE", 300))
+
+# in-process cache of student photos, pre-resized to the 216x216 kiosk card
+PHOTO_CACHE_SIZE = int(os.getenv("PHOTO_CACHE_SIZE", 512))
+PHOTO_CACHE_TTL = float(os.getenv("PHOTO_CACHE_TTL", 3600))
+
+# /admin/photo/<id> thumbnails are cached on disk here; browsers may reuse one
+# for THUMBNAIL_MAX_AGE seconds before revalidating it against its ETag
+THUMBNAIL_FOLDER = os.getenv("THUMBNAIL_FOLDER", "thumbnails")
+THUMBNAIL_MAX_AGE = int(os.getenv("THUMBNAIL_MAX_AGE", 3600))
+
+# student photos are mirrored to Cloud Storage by content hash: the hashes of
+# the local files are kept in PHOTO_MANIFEST and only changed photos are sent,
+# STORAGE_SYNC_WORKERS at a time
+PHOTO_MANIFEST = os.getenv("PHOTO_MANIFEST", "photo_manifest.json")
+STORAGE_SYNC_WORKERS = int(os.getenv("STORAGE_SYNC_WORKERS", 4))
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", 50))
+
+# enrollments (encode, index, upload) run on this many background threads
+ENROLL_WORKERS = int(os.getenv("ENROLL_WORKERS", 2))
+
+# /admin/group_photo scales photos down to this many pixels on the long side
+# before detection; upsampling finds smaller faces at a higher cost
+GROUP_PHOTO_MAX_SIDE = int(os.getenv("GROUP_PHOTO_MAX_SIDE", 2000))
+GROUP_PHOTO_UPSAMPLE = int(os.getenv("GROUP_PHOTO_UPSAMPLE", 1))
+
+# attendance marks are logged here first and flushed to Firebase in batches;
+# further workers on the host log to <file>.1, <file>.2...
+ATTENDANCE_WAL = os.getenv("ATTENDANCE_WAL", "attendance.wal")
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", 1.0))
+
+# who is present is recorded once per session in this SQLite file; a session
+# is a calendar day ("day") or a block of this many minutes from midnight
+ATTENDANCE_DB = os.getenv("ATTENDANCE_DB", "attendance.db")
+ATTENDANCE_SESSION = os.getenv("ATTENDANCE_SESSION", "day")
+
+# /video streams at most STREAM_FPS frames a second at STREAM_QUALITY JPEG
+# quality; clients may ask for less with ?fps= and ?quality=. A camera frame
+# that differs from the last one by less than STREAM_STILL_THRESHOLD (mean
+# 0-255 difference on a coarse grid) with no overlay change is not redrawn.
+STREAM_FPS = float(os.getenv("STREAM_FPS", 30))
+STREAM_QUALITY = int(os.getenv("STREAM_QUALITY", 80))
+STREAM_STILL_THRESHOLD = float(os.getenv("STREAM_STILL_THRESHOLD", 1.0))
+
+# state shared by app workers (attendance marks, gallery version, camera
+# leases): memory:// for a single process, sqlite:///state.db for several
+# workers on one host. A camera is owned by the worker that opened it for
+# CAMERA_LEASE_TTL seconds past its last frame.
+STATE_URL = os.getenv("STATE_URL", "memory://")
+CAMERA_LEASE_TTL = float(os.getenv("CAMERA_LEASE_TTL", 10))
+
+# cameras served at /video/<camera_id>: comma-separated id=source pairs where
+# the source is a device index, an RTSP/HTTP URL or a video file
+CAMERAS = {}
+for _item in os.getenv("CAMERAS", "0=0").split(","):
+    _camera_id, _, _source = _item.strip().partition("=")
+    if _camera_id:
+        _source = _source.strip() or _camera_id
+        CAMERAS[_camera_id.strip()] = int(_source) if _source.isdigit() else _source
+
+# gallery partitions group students by this field of their record (a list
+# value puts a student in several). A camera bound to a partition matches its
+# faces against those students first and, with PARTITION_FALLBACK, looks up
+# the ones it does not recognize in the whole gallery. CAMERA_PARTITIONS holds
+# comma-separated camera_id=partition pairs; bindings can also be changed at
+# /video/<camera_id>/partition.
+PARTITION_FIELD = os.getenv("PARTITION_FIELD", "major")
+PARTITION_FALLBACK = os.getenv("PARTITION_FALLBACK", "1") == "1"
+CAMERA_PARTITIONS = {}
+for _item in os.getenv("CAMERA_PARTITIONS", "").split(","):
+    _camera_id, _, _partition = _item.partition("=")
+    if _camera_id.strip() and _partition.strip():
+        CAMERA_PARTITIONS[_camera_id.strip()] = _partition.strip()
@@ -0,0 +1,362 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+import threading
+
+import numpy as np
+
+from matcher import TOLERANCE, FaceMatcher
+from state import FileLock
+
+IMAGE_FOLDER = "static/Files/Images"
+ENCODE_FILE = "EncodeFile.gal"
+LEGACY_ENCODE_FILE = "EncodeFile.p"
+CACHE_FILE = "EncodeCache.p"
+PARTITION_FILE = "EncodeFile.partitions.json"
+
+# EncodeFile.gal layout, all little-endian:
+#   MAGIC | uint32 header length | header JSON | ID table JSON | pad to 64 |
+#   float32 encodings (count x dim, C order) | float32 squared norms (count)
+MAGIC = b"COGGAL\x00\x00"
+FORMAT_VERSION = 1
+ALIGN = 64
+DIM = 128
+
+
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def encode_image(path):
+    import cv2
+    import face_recognition
+
+    img = cv2.imread(path)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    encodings = face_recognition.face_encodings(img)
+    if not encodings:
+        return None
+    return encodings[0]
+
+
+def _replace(path, write):
+    # write next to the target and swap it in, so readers never see half a
+    # file and processes that still map the old one keep a valid copy
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as file:
+        write(file)
+    os.replace(tmp, path)
+
+
+def write_gallery(path, ids, encodings):
+    ids = list(ids)
+    encodings = np.ascontiguousarray(encodings, dtype="<f4").reshape(len(ids), DIM)
+    norms = np.einsum("ij,ij->i", encodings, encodings).astype("<f4")
+
+    id_table = json.dumps(ids).encode("utf-8")
+    header = json.dumps(
+        {
+            "version": FORMAT_VERSION,
+            "count": len(ids),
+            "dim": DIM,
+            "dtype": "<f4",
+            "ids_length": len(id_table),
+        }
+    ).encode("utf-8")
+    start = len(MAGIC) + 4 + len(header) + len(id_table)
+
+    def write(file):
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(header)))
+        file.write(header)
+        file.write(id_table)
+        file.write(b"\x00" * (-start % ALIGN))
+        file.write(encodings.tobytes())
+        file.write(norms.tobytes())
+
+    _replace(path, write)
+
+
+def open_gallery(path):
+    """Map a gallery file read-only; returns ``(ids, encodings, norms)``.
+
+    Only the header and ID table are read. The matrices are memory-mapped,
+    so every process that opens the same file shares one copy in the page
+    cache.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a face gallery file")
+        (size,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(size))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has unsupported gallery version {header['version']}")
+        ids = json.loads(file.read(header["ids_length"]))
+
+    count, dim, dtype = header["count"], header["dim"], header["dtype"]
+    if not count:
+        return ids, np.zeros((0, dim), np.float32), np.zeros(0, np.float32)
+
+    offset = len(MAGIC) + 4 + size + header["ids_length"]
+    offset += -offset % ALIGN
+    encodings = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count, dim))
+    norms = np.memmap(
+        path, dtype=dtype, mode="r", offset=offset + encodings.nbytes, shape=(count,)
+    )
+    return ids, encodings, norms
+
+
+def convert_legacy(legacy_path=LEGACY_ENCODE_FILE, path=ENCODE_FILE):
+    with open(legacy_path, "rb") as file:
+        encodeListKnown, studentIDs = pickle.load(file)
+    write_gallery(path, studentIDs, encodeListKnown)
+    return len(studentIDs)
+
+
+class FaceGallery:
+    """Known face encodings keyed by student ID.
+
+    Students are added, replaced and removed one at a time; only the image
+    being enrolled is ever encoded. Encodings are also cached by the SHA-1 of
+    the source image so a full rebuild skips photos it has already seen.
+
+    Partitions name subsets of the students (e.g. everyone taking one major)
+    and are kept in a small JSON file next to the gallery, so every worker
+    sees the same ones. ``matcher(partition=name)`` searches only that
+    subset.
+
+    With a ``state`` backend every save bumps its ``"gallery"`` version, and
+    a gallery that sees the version move reloads, so several app workers
+    keep the same students. Changes hold a lock file next to the gallery
+    from the reload through the save, so two workers enrolling at once
+    cannot drop each other's students.
+    """
+
+    def __init__(
+        self,
+        path=ENCODE_FILE,
+        cache_path=CACHE_FILE,
+        encoder=encode_image,
+        legacy_path=LEGACY_ENCODE_FILE,
+        partitions_path=PARTITION_FILE,
+        state=None,
+    ):
+        self.path = path
+        self.state = state
+        self.partitions_path = partitions_path
+        self.cache_path = cache_path
+        self.legacy_path = legacy_path
+        self.encoder = encoder
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(f"{path}.lock")
+        self.ids = []
+        self.index = {}
+        self.encodings = np.zeros((0, DIM), np.float32)
+        self.norms = None
+        self.cache = {}
+        self.version = 0
+        self._matcher = None
+        self._stat = None
+        self.partitions = {}
+        self._partition_matchers = {}
+        self._partitions_stat = None
+        self._shared = None if state is None else state.version("gallery")
+        self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, student_id):
+        return student_id in self.index
+
+    def load(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                self._stat = self._file_stat()
+                self._set(*open_gallery(self.path))
+            elif self.legacy_path and os.path.exists(self.legacy_path):
+                with open(self.legacy_path, "rb") as file:
+                    encodeListKnown, studentIDs = pickle.load(file)
+                self._set(studentIDs, encodeListKnown)
+            if self.cache_path and os.path.exists(self.cache_path):
+                with open(self.cache_path, "rb") as file:
+                    self.cache = pickle.load(file)
+            self._load_partitions()
+
+    def reload_if_changed(self):
+        # another worker may have enrolled or deleted someone
+        with self.lock:
+            stat = self._file_stat()
+            shared = None if self.state is None else self.state.version("gallery")
+            if (stat is not None and stat != self._stat) or shared != self._shared:
+                self._shared = shared
+                self.load()
+                self.version += 1
+            elif self.partitions_path and self._file_stat(self.partitions_path) != self._partitions_stat:
+                self._load_partitions()
+
+    def save(self):
+        with self.lock:
+            write_gallery(self.path, self.ids, self.encodings)
+            if self.cache_path:
+                _replace(self.cache_path, lambda file: pickle.dump(self.cache, file))
+            self._stat = self._file_stat()
+            if self.state is not None:
+                self._shared = self.state.bump("gallery")
+
+    def matcher(self, tolerance=TOLERANCE, partition=None):
+        self.reload_if_changed()
+        with self.lock:
+            if partition is not None:
+                return self._partition_matcher(partition, tolerance)
+            cached = self._matcher
+            if cached is None or cached[0] != (self.version, tolerance):
+                matcher = FaceMatcher(self.ids, self.encodings, tolerance, self.norms)
+                cached = (self.version, tolerance), matcher
+                self._matcher = cached
+            return cached[1]
+
+    def set_partitions(self, partitions):
+        """Replace every partition with ``{name: student IDs}``; False if nothing changed."""
+        partitions = {
+            str(name): sorted({str(student_id) for student_id in ids})
+            for name, ids in partitions.items()
+        }
+        with self.lock, self.file_lock:
+            if partitions == self.partitions:
+                return False
+            if self.partitions_path:
+                data = json.dumps(partitions, sort_keys=True).encode("utf-8")
+                _replace(self.partitions_path, lambda file: file.write(data))
+                self._partitions_stat = self._file_stat(self.partitions_path)
+            self.partitions = partitions
+            self._partition_matchers = {}
+            return True
+
+    def encode(self, image_path, digest=None):
+        digest = digest or file_hash(image_path)
+        with self.lock:
+            encoding = self.cache.get(digest)
+        if encoding is None:
+            # encode outside the lock; only the cache update must not race save()
+            encoding = self.encoder(image_path)
+            if encoding is None:
+                return None
+            with self.lock:
+                self.cache[digest] = encoding
+        return encoding
+
+    def add(self, student_id, image_path, encoding=None):
+        if encoding is None:
+            encoding = self.encode(image_path)
+        if encoding is None:
+            raise ValueError(f"No face found in {image_path}")
+        encoding = np.asarray(encoding, dtype=np.float32)
+
+        with self.lock, self.file_lock:
+            # start from what other workers have saved, not a stale copy
+            self.reload_if_changed()
+            row = self.index.get(student_id)
+            if row is None:
+                self.index[student_id] = len(self.ids)
+                self.ids.append(student_id)
+                self.encodings = np.vstack([self.encodings, encoding])
+            else:
+                # the current matrix may be a read-only map of the file
+                encodings = np.array(self.encodings)
+                encodings[row] = encoding
+                self.encodings = encodings
+            self.norms = None
+            self.version += 1
+            self.save()
+
+    def remove(self, student_id):
+        with self.lock, self.file_lock:
+            self.reload_if_changed()
+            row = self.index.get(student_id)
+            if row is None:
+                return False
+            ids = self.ids[:row] + self.ids[row + 1 :]
+            self._set(ids, np.delete(self.encodings, row, axis=0))
+            self.version += 1
+            self.save()
+            return True
+
+    def rebuild(self, folder=IMAGE_FOLDER):
+        """Re-index every photo in ``folder``; returns the files with no face."""
+        ids = []
+        encodings = []
+        seen = set()
+        skipped = []
+
+        for path in sorted(os.listdir(folder)):
+            if path.startswith("."):
+                # uploads still being checked by an enrollment
+                continue
+            image_path = os.path.join(folder, path)
+            digest = file_hash(image_path)
+            encoding = self.encode(image_path, digest)
+            if encoding is None:
+                skipped.append(path)
+                continue
+            ids.append(os.path.splitext(path)[0])
+            encodings.append(encoding)
+            seen.add(digest)
+
+        with self.lock, self.file_lock:
+            self.cache = {k: v for k, v in self.cache.items() if k in seen}
+            self._set(ids, encodings)
+            self.version += 1
+            self.save()
+        return skipped
+
+    def _partition_matcher(self, name, tolerance):
+        # an unknown partition matches nobody
+        cached = self._partition_matchers.get(name)
+        if cached is None or cached[0] != (self.version, tolerance):
+            rows = [self.index[i] for i in self.partitions.get(name, ()) if i in self.index]
+            matcher = FaceMatcher(
+                [self.ids[row] for row in rows],
+                self.encodings[rows],
+                tolerance,
+                None if self.norms is None else self.norms[rows],
+            )
+            cached = (self.version, tolerance), matcher
+            self._partition_matchers[name] = cached
+        return cached[1]
+
+    def _load_partitions(self):
+        if not self.partitions_path:
+            return
+        self._partitions_stat = self._file_stat(self.partitions_path)
+        if self._partitions_stat is None:
+            return
+        with open(self.partitions_path, "rb") as file:
+            self.partitions = json.load(file)
+        self._partition_matchers = {}
+
+    def _set(self, ids, encodings, norms=None):
+        self.ids = list(ids)
+        self.index = {student_id: row for row, student_id in enumerate(self.ids)}
+        self.norms = norms
+        if isinstance(encodings, np.memmap):
+            self.encodings = encodings
+        elif len(self.ids):
+            self.encodings = np.asarray(encodings, dtype=np.float32).reshape(len(self.ids), DIM)
+        else:
+            self.encodings = np.zeros((0, DIM), np.float32)
+
+    def _file_stat(self, path=None):
+        if path is None:
+            path = self.path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
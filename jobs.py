@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """One queued piece of work and how far it has got.
+
+    ``work`` calls ``advance(stage)`` as it finishes each step; the times are
+    kept so the status shows where a slow job is spending its time.
+    """
+
+    def __init__(self, subject):
+        self.id = uuid.uuid4().hex
+        self.subject = subject
+        self.state = "queued"
+        self.stage = None
+        self.stages = {}
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def advance(self, stage):
+        self.stage = stage
+        self.stages[stage] = time.time()
+
+    def status(self):
+        return {
+            "id": self.id,
+            "subject": self.subject,
+            "state": self.state,
+            "stage": self.stage,
+            "stages": dict(self.stages),
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a small thread pool and keeps their status for polling.
+
+    The most recent ``keep`` jobs are remembered; older finished ones are
+    forgotten.
+    """
+
+    def __init__(self, workers=2, keep=500):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="job")
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+
+    def submit(self, work, subject=None, stage=None):
+        """Queue ``work(job)`` and return the job straight away."""
+        job = Job(subject)
+        if stage is not None:
+            job.advance(stage)
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.keep:
+                oldest = next(iter(self.jobs.values()))
+                if oldest.finished is None:
+                    break
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[job.state] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, job, work):
+        job.state = "running"
+        try:
+            work(job)
+            job.state = "done"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
@@ -0,0 +1,228 @@
+import os
+from collections import OrderedDict, namedtuple
+
+import cv2
+import cvzone
+import numpy as np
+
+BACKGROUND = "static/Files/Resources/background.png"
+MODES_FOLDER = "static/Files/Resources/Modes/"
+
+# where the camera frame and the mode panel sit on the background
+CAMERA_AREA = (slice(162, 162 + 480), slice(55, 55 + 640))
+PANEL_AREA = (slice(44, 44 + 633), slice(808, 808 + 414))
+# strips around the camera area that face boxes and the banner draw over
+CAMERA_BORDER = [(140, 162, 45, 705), (642, 652, 45, 705), (162, 642, 45, 55), (162, 642, 695, 705)]
+PANEL_CACHE_SIZE = 32
+
+# modeType: 0 active, 1 student details, 2 marked, 3 already marked, 4 not found
+View = namedtuple("View", ["mode", "boxes", "banner", "student"])
+Student = namedtuple("Student", ["id", "info", "image"])
+# shared so that an idle kiosk keeps the same view object from frame to frame
+IDLE = View(0, (), None, None)
+
+
+class Kiosk:
+    """The attendance kiosk screen: mode panel, student card and face boxes.
+
+    ``update`` advances the state machine once per recognition result and may
+    block on the database; ``render`` only draws the latest state onto a
+    camera frame, so it can run on another thread at the camera's rate.
+
+    ``is_marked`` tells whether a student is already present in the current
+    attendance session; without it a student counts as marked for 60 seconds
+    after their last attendance time. ``mark`` returns False when someone
+    else marked the student first, which shows them as already marked.
+    """
+
+    def __init__(self, lookup, mark, on_already_marked, is_marked=None):
+        self.lookup = lookup
+        self.mark = mark
+        self.on_already_marked = on_already_marked
+        self.is_marked = is_marked
+
+        self.background = cv2.imread(BACKGROUND)
+        self.imgBackground = self.background.copy()
+        self.imgModeList = [
+            cv2.imread(os.path.join(MODES_FOLDER, path))
+            for path in sorted(os.listdir(MODES_FOLDER))
+        ]
+
+        self.modeType = 0
+        self.counter = 0
+        self.id = -1
+        self.student = None
+        # replaced wholesale, never mutated, so render() needs no lock
+        self.view = IDLE
+
+        # pre-rendered side panels by (student id, mode), least recent first
+        self.panels = OrderedDict()
+        self._panel_key = None
+        self._overlay_drawn = False
+
+    def update(self, faces):
+        if not faces:
+            self.modeType = 0
+            self.counter = 0
+            self.view = IDLE
+            return
+
+        boxes = []
+        banner = None
+        for face in faces:
+            y1, x2, y2, x1 = face.location
+            boxes.append((55 + x1, 162 + y1, x2 - x1, y2 - y1))
+
+            if face.match.accepted:
+                self.id = face.match.id
+                if self.counter == 0:
+                    banner = "Face Detected"
+                    self.counter = 1
+                    self.modeType = 1
+            else:
+                banner = "Face Not Found"
+                self.modeType = 4
+                self.counter = 0
+
+        student = None
+        if self.counter != 0:
+            if self.counter == 1:
+                self._arrive(self.id)
+
+            if self.modeType not in (3, 4):
+                if 5 < self.counter <= 10:
+                    self.modeType = 2
+                if self.counter <= 5:
+                    student = self.student
+
+                self.counter += 1
+                if self.counter >= 10:
+                    self.counter = 0
+                    self.modeType = 0
+                    self.student = None
+
+        self.view = View(self.modeType, tuple(boxes), banner, student)
+
+    def _arrive(self, id):
+        found = self.lookup(id)
+        if found is None:
+            self.modeType = 4
+            self.counter = 0
+            return
+
+        studentInfo, imgStudent, secondElapsed = found
+        self.student = Student(id, studentInfo, cv2.resize(imgStudent, (216, 216)))
+        recent = secondElapsed is not None and secondElapsed <= 60
+        if not recent and not (self.is_marked and self.is_marked(id)):
+            if self.mark(id, studentInfo):
+                return
+        self.modeType = 3
+        self.counter = 0
+        self.on_already_marked(id, studentInfo)
+
+    def render(self, img):
+        """Draw ``view`` over ``img`` into the kiosk canvas and return it.
+
+        The canvas is allocated once and reused, so the result is only valid
+        until the next call. Only the camera area is copied every frame; the
+        side panel is redrawn when the mode or student changes.
+        """
+        view = self.view
+        canvas = self.imgBackground
+
+        if self._overlay_drawn:
+            # face boxes and the banner spill past the camera area
+            for y1, y2, x1, x2 in CAMERA_BORDER:
+                canvas[y1:y2, x1:x2] = self.background[y1:y2, x1:x2]
+        np.copyto(canvas[CAMERA_AREA], img)
+
+        drawn = self._panel_key
+        if drawn is None or drawn[0] != view.mode or drawn[1] is not view.student:
+            canvas[PANEL_AREA] = self._panel(view.mode, view.student)
+            self._panel_key = (view.mode, view.student)
+
+        for bbox in view.boxes:
+            cvzone.cornerRect(canvas, bbox, rt=0)
+        self._overlay_drawn = bool(view.boxes or view.banner)
+        if view.banner:
+            cvzone.putTextRect(canvas, view.banner, (65, 200), thickness=2)
+
+        return canvas
+
+    def invalidate(self):
+        """Forget every pre-rendered panel and repaint the canvas on the next frame."""
+        self.panels.clear()
+        self.imgBackground[:] = self.background
+        self._panel_key = None
+        self._overlay_drawn = False
+
+    def _panel(self, mode, student):
+        if student is None:
+            return self.imgModeList[mode]
+
+        key = (student.id, mode)
+        cached = self.panels.get(key)
+        if cached is not None and cached[0] is student:
+            self.panels.move_to_end(key)
+            return cached[1]
+
+        panel = self.imgModeList[mode].copy()
+        self._draw_student(panel, student)
+        self.panels[key] = (student, panel)
+        if len(self.panels) > PANEL_CACHE_SIZE:
+            self.panels.popitem(last=False)
+        return panel
+
+    def _draw_student(self, panel, student):
+        # coordinates are relative to the panel at (808, 44) on the background
+        studentInfo = student.info
+        cv2.putText(
+            panel,
+            str(studentInfo["total_attendance"]),
+            (53, 81),
+            cv2.FONT_HERSHEY_COMPLEX,
+            1,
+            (255, 255, 255),
+            1,
+        )
+        cv2.putText(
+            panel,
+            str(studentInfo["major"]),
+            (198, 506),
+            cv2.FONT_HERSHEY_COMPLEX,
+            0.5,
+            (255, 255, 255),
+            1,
+        )
+        cv2.putText(
+            panel,
+            str(student.id),
+            (198, 449),
+            cv2.FONT_HERSHEY_COMPLEX,
+            0.5,
+            (255, 255, 255),
+            1,
+        )
+        cv2.putText(
+            panel,
+            str(studentInfo.get("standing", "N/A")),
+            (102, 581),
+            cv2.FONT_HERSHEY_COMPLEX,
+            0.6,
+            (100, 100, 100),
+            1,
+        )
+
+        (w, h), _ = cv2.getTextSize(str(studentInfo["name"]), cv2.FONT_HERSHEY_COMPLEX, 1, 1)
+        offset = (414 - w) // 2
+        cv2.putText(
+            panel,
+            str(studentInfo["name"]),
+            (offset, 401),
+            cv2.FONT_HERSHEY_COMPLEX,
+            1,
+            (50, 50, 50),
+            1,
+        )
+
+        panel[131 : 131 + 216, 101 : 101 + 216] = student.image
@@ -0,0 +1,178 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from state import MemoryState
+
+LEDGER_FILE = "attendance.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ends_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS marks (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    student_id TEXT NOT NULL,
+    name TEXT,
+    major TEXT,
+    camera TEXT,
+    marked_at REAL NOT NULL,
+    PRIMARY KEY (session_id, student_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS marks_by_time ON marks (session_id, marked_at);
+"""
+
+
+def session_window(now, length="day"):
+    """Start and end (epoch seconds) of the session ``now`` falls in.
+
+    ``length`` is ``"day"`` for calendar days or a number of minutes, with
+    windows counted from local midnight (``"90"`` gives 00:00-01:30, ...).
+    """
+    moment = datetime.fromtimestamp(now)
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if length == "day":
+        start, end = midnight, midnight + timedelta(days=1)
+    else:
+        minutes = timedelta(minutes=float(length))
+        start = midnight + ((moment - midnight) // minutes) * minutes
+        end = min(start + minutes, midnight + timedelta(days=1))
+    return start.timestamp(), end.timestamp()
+
+
+class AttendanceLedger:
+    """Who was marked present in each attendance session, kept in SQLite.
+
+    A session is a time window (a day, or a lecture-sized block) and rolls
+    over on its own when the window ends; ``new_session`` closes the current
+    one early. Each student is recorded once per session, with the time and
+    camera of their first mark.
+
+    Who is present is decided through ``state`` (see ``state.py``): its
+    ``add_mark`` picks the one mark that counts when several workers see a
+    student at once, and its ``"session"`` version tells every worker that
+    another one started a new session.
+    """
+
+    def __init__(self, path=LEDGER_FILE, length="day", clock=time.time, state=None):
+        self.length = length
+        self.clock = clock
+        self.state = state if state is not None else MemoryState()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.session = None
+        self.seen = None
+        with self.lock:
+            self._load()
+
+    def __contains__(self, student_id):
+        with self.lock:
+            self._roll()
+            return self.state.has_mark(self.session[0], student_id)
+
+    def __len__(self):
+        with self.lock:
+            self._roll()
+            return self.conn.execute(
+                "SELECT count(*) FROM marks WHERE session_id = ?", (self.session[0],)
+            ).fetchone()[0]
+
+    def mark(self, student_id, info=None, camera=None):
+        """Record ``student_id`` as present; False if already in this session."""
+        info = info or {}
+        with self.lock:
+            self._roll()
+            if not self.state.add_mark(self.session[0], student_id):
+                return False
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO marks VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        self.session[0],
+                        student_id,
+                        info.get("name"),
+                        info.get("major"),
+                        camera,
+                        self.clock(),
+                    ),
+                )
+            return True
+
+    def marks(self, session_id=None):
+        """Marks of a session (the current one by default), oldest first."""
+        with self.lock:
+            self._roll()
+            rows = self.conn.execute(
+                "SELECT student_id, name, major, camera, marked_at FROM marks"
+                " WHERE session_id = ? ORDER BY marked_at",
+                (session_id or self.session[0],),
+            ).fetchall()
+        return [
+            {"id": student_id, "name": name, "major": major, "camera": camera, "marked_at": marked_at}
+            for student_id, name, major, camera, marked_at in rows
+        ]
+
+    def current(self):
+        with self.lock:
+            self._roll()
+            session_id, started_at, ends_at = self.session
+        return {"id": session_id, "started_at": started_at, "ends_at": ends_at}
+
+    def new_session(self):
+        """End the current session now and start the next one."""
+        with self.lock:
+            now = self.clock()
+            with self.conn:
+                self.conn.execute("UPDATE sessions SET ends_at = ? WHERE id = ?", (now, self.session[0]))
+            self._start(now, session_window(now, self.length)[1])
+            self.state.prune(self.session[0])
+            self.seen = self.state.bump("session")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _load(self):
+        now = self.clock()
+        self.seen = self.state.version("session")
+        # find-or-create in one write transaction, so workers starting
+        # together agree on the session
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, started_at, ends_at FROM sessions WHERE ends_at > ? ORDER BY id DESC LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                started_at, ends_at = session_window(now, self.length)
+                cursor = self.conn.execute(
+                    "INSERT INTO sessions (started_at, ends_at) VALUES (?, ?)", (started_at, ends_at)
+                )
+                row = (cursor.lastrowid, started_at, ends_at)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.session = row
+        # earlier sessions stay in the ledger's own table only
+        self.state.prune(row[0])
+        # a fresh in-memory state learns the marks made before a restart
+        for (student_id,) in self.conn.execute(
+            "SELECT student_id FROM marks WHERE session_id = ?", (row[0],)
+        ).fetchall():
+            self.state.add_mark(row[0], student_id)
+
+    def _roll(self):
+        if self.clock() >= self.session[2] or self.state.version("session") != self.seen:
+            self._load()
+
+    def _start(self, started_at, ends_at):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO sessions (started_at, ends_at) VALUES (?, ?)", (started_at, ends_at)
+            )
+        self.session = (cursor.lastrowid, started_at, ends_at)
@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+import numpy as np
+
+TOLERANCE = 0.6
+
+Match = namedtuple("Match", ["id", "distance", "accepted"])
+
+
+class FaceMatcher:
+    """Nearest-neighbour lookup over the whole gallery in one matrix product.
+
+    Encodings are kept as a single contiguous float32 matrix with the squared
+    row norms precomputed, so scoring every face in a frame against every
+    student is ``|a|^2 + |b|^2 - 2ab`` for the whole batch at once.
+    """
+
+    def __init__(self, ids, encodings, tolerance=TOLERANCE, norms=None):
+        self.ids = list(ids)
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(
+            len(self.ids), 128
+        )
+        if norms is None:
+            norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        self.norms = np.asarray(norms, dtype=np.float32)
+        self.tolerance = tolerance
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances(self, faces):
+        faces = np.asarray(faces, dtype=np.float32).reshape(-1, 128)
+        squared = self._squared(faces)
+        return np.sqrt(squared, out=squared)
+
+    def match(self, faces):
+        faces = np.asarray(faces, dtype=np.float32).reshape(-1, 128)
+        if not len(self.ids):
+            return [Match(None, float("inf"), False) for _ in range(len(faces))]
+
+        squared = self._squared(faces)
+        best = np.argmin(squared, axis=1)
+        best_distance = np.sqrt(squared[np.arange(len(faces)), best])
+
+        return [
+            Match(self.ids[row], float(distance), bool(distance <= self.tolerance))
+            for row, distance in zip(best, best_distance)
+        ]
+
+    def _squared(self, faces):
+        squared = faces @ self.encodings.T
+        squared *= -2
+        squared += self.norms
+        squared += np.einsum("ij,ij->i", faces, faces)[:, None]
+        return np.maximum(squared, 0, out=squared)
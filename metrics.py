@@ -0,0 +1,174 @@
+"""Minimal in-process metrics rendered in the Prometheus text format.
+
+Counters and histograms are a dict lookup and an add under a lock, cheap
+enough to leave on in the video loop. Gauges read their value from a
+callback when ``/metrics`` is scraped.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def _header(self):
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+
+    def render(self):
+        with self.lock:
+            values = list(self.values.items())
+        lines = [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}\n"
+            for key, value in values
+        ]
+        return self._header() + "".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value read from ``function`` at scrape time.
+
+    ``function`` returns a number, or a dict of label-value tuples to numbers
+    for a labelled gauge. ``kind`` can be set to ``"counter"`` for totals
+    that are kept elsewhere, such as cache hit counts.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, function, labels=(), kind="gauge", registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.function = function
+        self.kind = kind
+
+    def render(self):
+        try:
+            values = self.function()
+        except Exception:
+            return ""
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}\n"
+            for key, value in values.items()
+        ]
+        return self._header() + "".join(lines)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self.lock:
+            values = [(key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items()]
+
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                labels = _format_labels(self.labels, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}\n")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}\n")
+            lines.append(f"{self.name}_count{labels} {count}\n")
+        return self._header() + "".join(lines)
+
+
+# what the app exports
+
+STAGE_SECONDS = Histogram(
+    "cognito_stage_seconds",
+    "Time spent in each step of the video loop.",
+    ["camera", "stage"],
+)
+FIREBASE_SECONDS = Histogram(
+    "cognito_firebase_seconds",
+    "Latency of Firebase Realtime Database and Cloud Storage calls.",
+    ["op"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+FRAMES = Counter("cognito_frames_total", "Frames through each pipeline stage.", ["camera", "stage"])
+FACES = Counter("cognito_faces_total", "Faces seen by recognition.", ["camera"])
+MATCHES = Counter("cognito_matches_total", "Faces matched to an enrolled student.", ["camera"])
+UNKNOWNS = Counter("cognito_unknown_faces_total", "Faces that matched nobody.", ["camera"])
+ATTENDANCE_WRITES = Counter(
+    "cognito_attendance_writes_total", "Attendance marks queued for the database."
+)
+STREAM_BYTES = Counter("cognito_stream_bytes_total", "JPEG bytes sent to /video clients.", ["camera"])
@@ -1,6 +1,6 @@
 import cv2
 import os
-import pickle
+import sys
 import face_recognition
 import numpy as np
 import cvzone
@@ -40,10 +40,10 @@ for path in modePathList:
 
 # encoding loading ---> to identify if the person is in our database or not.... to detect faces that are known or not
 
-file = open("EncodeFile.p", "rb")
-encodeListKnownWithIds = pickle.load(file)
-file.close()
-encodedFaceKnown, studentIds = encodeListKnownWithIds
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gallery import ENCODE_FILE, open_gallery
+
+studentIds, encodedFaceKnown, _ = open_gallery(ENCODE_FILE)
 # print(studentIds)
 
 modeType = 0
@@ -78,7 +78,7 @@ while True:
         for encodeFace, faceLocation in zip(encodeCurrentFrame, faceCurrentFrame):
             matches = face_recognition.compare_faces(
                 encodedFaceKnown, encodeFace
-            )  # the one from the pickle file will be compared with the current encodeFace
+            )  # the one from the gallery file will be compared with the current encodeFace
             faceDistance = face_recognition.face_distance(encodedFaceKnown, encodeFace)
             # print('matches', matches)
             # print('faceDistance', faceDistance)
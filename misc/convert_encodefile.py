@@ -0,0 +1,14 @@
+# one-shot conversion of the old pickled EncodeFile.p to the memory-mapped
+# EncodeFile.gal read by the app; run from the repository root
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery import ENCODE_FILE, LEGACY_ENCODE_FILE, convert_legacy
+
+source = sys.argv[1] if len(sys.argv) > 1 else LEGACY_ENCODE_FILE
+target = sys.argv[2] if len(sys.argv) > 2 else ENCODE_FILE
+
+count = convert_legacy(source, target)
+print(f"Converted {count} encodings from {source} to {target}")
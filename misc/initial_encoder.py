@@ -1,12 +1,13 @@
-import cv2
-import pickle
-import face_recognition
 import os
+import sys
 import firebase_admin
 from firebase_admin import credentials
-from firebase_admin import db
 from firebase_admin import storage
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gallery import IMAGE_FOLDER, FaceGallery
+from storage_sync import PhotoSync
+
 cred = credentials.Certificate("serviceAccountKey.json")
 firebase_admin.initialize_app(
     cred,
@@ -17,47 +18,18 @@ firebase_admin.initialize_app(
 )
 
 # student images
-folderPath = "static/Files/Images"
-imgPathList = os.listdir(folderPath)
-print(imgPathList)
-imgList = []
-studentIDs = []
-
-for path in imgPathList:
-    imgList.append(cv2.imread(os.path.join(folderPath, path)))
-    # print(os.path.splitext(path)[0])
-    studentIDs.append(os.path.splitext(path)[0])
-
-    fileName = f"{folderPath}/{path}"
-    bucket = storage.bucket()
-    blob = bucket.blob(fileName)
-    blob.upload_from_filename(fileName)
-
-print(studentIDs)
-
-
-def findEncodings(images):
-    encodeList = []
-
-    for img in images:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encode = face_recognition.face_encodings(img)[0]
-
-        encodeList.append(encode)
-
-    return encodeList
+folderPath = IMAGE_FOLDER
+print(os.listdir(folderPath))
 
+# upload only the photos the bucket does not already have
+print(PhotoSync(storage.bucket(), folderPath).sync())
 
 print("Encoding Started")
 
-encodeListKnown = findEncodings(imgList)
-
-encodeListKnownWithIds = [encodeListKnown, studentIDs]
-
-file = open("EncodeFile.p", "wb")
-pickle.dump(encodeListKnownWithIds, file)
-file.close()
-
-# print(encodeListKnown)
+# photos already in EncodeCache.p are not encoded again
+gallery = FaceGallery()
+skipped = gallery.rebuild(folderPath)
+for path in skipped:
+    print(f"No face found in {path}, skipped")
 
-print("Encoding Ended")
+print(f"Encoding Ended: {len(gallery)} students")
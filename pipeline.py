@@ -0,0 +1,172 @@
+import threading
+import time
+
+
+class LatestSlot:
+    """Single-slot hand-off between threads that always holds the newest item.
+
+    ``put`` never blocks: an item nobody has read yet is simply replaced, so a
+    slow reader skips stale frames instead of building up latency. Any number
+    of readers can wait on the same slot, each passing the last sequence
+    number it saw.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.item = None
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            self.seq += 1
+            self.item = item
+            self.cond.notify_all()
+
+    def get(self, after=0, timeout=None):
+        """Wait for an item newer than ``after``; ``None`` on timeout or close."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after or self.closed, timeout):
+                return None
+            if self.seq <= after:
+                return None
+            return self.seq, self.item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class Stage(threading.Thread):
+    """Runs ``work`` on every item it manages to take from ``source``.
+
+    Items that arrive while ``work`` is busy are skipped and counted in
+    ``dropped``. Non-``None`` results are published to ``sink``. An item
+    whose ``work`` raises is counted in ``errors`` and the stage carries on;
+    ``on_exit`` is called if the stage ends without being stopped.
+    """
+
+    def __init__(self, name, source, work, sink=None, on_exit=None):
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.work = work
+        self.sink = sink
+        self.on_exit = on_exit
+        self.stopped = threading.Event()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.fps = 0.0
+        self._last = None
+
+    def run(self):
+        seen = 0
+        try:
+            while not self.stopped.is_set():
+                got = self.source.get(seen, timeout=0.5)
+                if got is None:
+                    if self.source.closed:
+                        break
+                    continue
+                seq, item = got
+                if seen:
+                    self.dropped += seq - seen - 1
+                seen = seq
+
+                try:
+                    result = self.work(item)
+                except Exception as e:
+                    self._error(e)
+                    continue
+                self._tick()
+                if result is not None and self.sink is not None:
+                    self.sink.put(result)
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+            if self.on_exit is not None and not self.stopped.is_set():
+                self.on_exit()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self):
+        return {
+            "fps": round(self.fps, 1),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+    def _error(self, e):
+        self.errors += 1
+        message = f"{type(e).__name__}: {e}"
+        # a failure that repeats every frame is only reported once
+        if message != self.last_error:
+            print(f"⚠️  {self.name} stage: {message}")
+        self.last_error = message
+
+    def _tick(self):
+        now = time.monotonic()
+        if self._last is not None and now > self._last:
+            self.fps = 0.9 * self.fps + 0.1 / (now - self._last)
+        self._last = now
+        self.processed += 1
+
+
+class CaptureStage(Stage):
+    """Reads the camera as fast as it delivers and keeps only the newest frame."""
+
+    def __init__(self, capture, sink, on_exit=None):
+        super().__init__("capture", None, None, sink, on_exit)
+        self.capture = capture
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                success, img = self.capture.read()
+                if not success:
+                    break
+                self._tick()
+                self.sink.put(img)
+        finally:
+            self.capture.release()
+            self.sink.close()
+            if self.on_exit is not None and not self.stopped.is_set():
+                self.on_exit()
+
+
+class Pipeline:
+    """Capture, recognition and render stages on their own threads.
+
+    Recognition and rendering both read the newest captured frame. Rendering
+    never waits for recognition: it draws whatever overlay the last finished
+    recognition left behind, so a slow recognition step lowers the overlay
+    rate but not the video frame rate. If any stage ends on its own the
+    output is closed, so the ``Broadcaster`` builds a new pipeline for the
+    next viewer.
+    """
+
+    def __init__(self, capture, recognize, render):
+        self.frames = LatestSlot()
+        self.output = LatestSlot()
+        self.stages = [
+            CaptureStage(capture, self.frames, self.output.close),
+            Stage("recognize", self.frames, recognize, on_exit=self.output.close),
+            Stage("render", self.frames, render, self.output, self.output.close),
+        ]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
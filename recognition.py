@@ -0,0 +1,283 @@
+import time
+from collections import namedtuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+# location is (top, right, bottom, left) in full-resolution camera pixels
+Face = namedtuple("Face", ["location", "match"])
+
+MIN_IOU = 0.3
+MIN_SCORE = 0.5
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area = (a[1] - a[3]) * (a[2] - a[0]) + (b[1] - b[3]) * (b[2] - b[0])
+    return inter / (area - inter) if area > inter else 0.0
+
+
+class Track:
+    def __init__(self, location, gray, match, now):
+        self.match = match
+        self.confirm(location, gray, now)
+
+    def confirm(self, location, gray, now):
+        top, right, bottom, left = location
+        self.location = location
+        self.template = gray[top:bottom, left:right].copy()
+        self.confirmed = now
+
+    def follow(self, gray):
+        # correlation search for the last detected face in a window around
+        # where it was; returns False once the face is no longer there
+        top, right, bottom, left = self.location
+        h, w = self.template.shape
+        if not h or not w:
+            return False
+        pad = max(h, w) // 2
+        y0, x0 = max(0, top - pad), max(0, left - pad)
+        window = gray[y0 : bottom + pad, x0 : right + pad]
+        if window.shape[0] < h or window.shape[1] < w:
+            return False
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        # a featureless patch correlates with anything (or gives NaN)
+        if not score >= MIN_SCORE or self.template.std() < 1:
+            return False
+        self.location = (y0 + dy, x0 + dx + w, y0 + dy + h, x0 + dx)
+        return True
+
+
+class MotionGate:
+    """Cheap test for whether a frame is worth running face detection on.
+
+    The frame is shrunk to ``size``, blurred and compared with a running
+    average of recent frames. It counts as motion when at least ``area`` (a
+    fraction) of the pixels differ by more than ``threshold`` grey levels.
+    Someone standing still fades into the average, but their faces are
+    still reported from the last processed frame. Every ``refresh`` seconds
+    a frame is let through regardless, to catch slow changes.
+    """
+
+    def __init__(self, threshold=15, area=0.005, refresh=5.0, size=(80, 60), alpha=0.2):
+        self.threshold = threshold
+        self.area = area
+        self.refresh = refresh
+        self.size = size
+        self.alpha = alpha
+        self.background = None
+        self.gray = np.zeros(size[::-1], np.uint8)
+        self.diff = np.zeros(size[::-1], np.uint8)
+        self.passed = None
+
+    def __call__(self, img, now):
+        tiny = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(tiny, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.GaussianBlur(self.gray, (5, 5), 0, dst=self.gray)
+
+        if self.background is None:
+            self.background = self.gray.astype(np.float32)
+            moved = True
+        else:
+            cv2.absdiff(self.gray, cv2.convertScaleAbs(self.background), dst=self.diff)
+            moved = np.count_nonzero(self.diff > self.threshold) >= self.area * self.diff.size
+            cv2.accumulateWeighted(self.gray, self.background, self.alpha)
+
+        if moved or self.passed is None or now - self.passed >= self.refresh:
+            self.passed = now
+            return True
+        return False
+
+
+class FaceRecognizer:
+    """Detects, encodes and matches the faces in one camera frame.
+
+    With ``detect_interval`` above 1 the HOG detector only runs every that
+    many frames, or as soon as a track is lost; in between, each face is
+    followed by template correlation on the downscaled frame. A track keeps
+    the identity it was given, so a recognized face is not re-encoded while
+    it stays in view.
+
+    ``gate`` is an optional ``MotionGate``. Frames it holds back are not
+    looked at at all; the faces found in the last processed frame are
+    returned again.
+
+    ``partition`` names a gallery partition to match against (and can be
+    changed between frames); with ``fallback`` a face it does not recognize
+    is looked up in the whole gallery as well.
+    """
+
+    def __init__(
+        self, gallery, scale=0.25, detect_interval=1, track_ttl=1.0, gate=None, partition=None, fallback=True
+    ):
+        self.gallery = gallery
+        self.scale = scale
+        self.detect_interval = detect_interval
+        self.track_ttl = track_ttl
+        self.gate = gate
+        self.partition = partition
+        self.fallback = fallback
+        self.tracks = []
+        self.faces = []
+
+        self.frames = 0
+        self.gated = 0
+        self.detections = 0
+        self.encodings = 0
+        self.fallbacks = 0
+        # seconds spent per step during the last call
+        self.timings = {}
+
+    def __call__(self, img):
+        now = time.monotonic()
+        self.frames += 1
+        self.timings = {}
+
+        imgSmall = cv2.resize(img, (0, 0), None, self.scale, self.scale)
+
+        if self.gate is not None and not self._timed("gate", self.gate, imgSmall, now):
+            self.gated += 1
+            return self.faces
+
+        if self.detect_interval <= 1:
+            imgSmall = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
+            self.faces = self._recognize(imgSmall)
+            return self.faces
+
+        gray = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2GRAY)
+        tracks = [t for t in self.tracks if now - t.confirmed <= self.track_ttl]
+        lost = len(tracks) != len(self.tracks)
+        self.tracks = self._timed("track", lambda: [t for t in tracks if t.follow(gray)])
+        lost = lost or len(self.tracks) != len(tracks)
+
+        if lost or not self.tracks or self.frames % self.detect_interval == 0:
+            imgSmall = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
+            self._detect(imgSmall, gray, now)
+
+        self.faces = [Face(self._upscale(t.location), t.match) for t in self.tracks]
+        return self.faces
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "gated": self.gated,
+            "processed": self.frames - self.gated,
+            "detections": self.detections,
+            "encodings": self.encodings,
+            "fallbacks": self.fallbacks,
+            "tracks": len(self.tracks),
+        }
+
+    def _recognize(self, imgSmall):
+        faceCurrentFrame = self._timed("detect", face_recognition.face_locations, imgSmall)
+        self.detections += 1
+        if not faceCurrentFrame:
+            return []
+
+        matches = self._match(imgSmall, faceCurrentFrame)
+        return [
+            Face(self._upscale(location), match)
+            for location, match in zip(faceCurrentFrame, matches)
+        ]
+
+    def _detect(self, imgSmall, gray, now):
+        faceCurrentFrame = self._timed("detect", face_recognition.face_locations, imgSmall)
+        self.detections += 1
+
+        free = list(self.tracks)
+        unknown = []
+        for location in faceCurrentFrame:
+            best = max(free, key=lambda t: iou(t.location, location), default=None)
+            if best is not None and iou(best.location, location) >= MIN_IOU:
+                free.remove(best)
+                best.confirm(location, gray, now)
+                if best.match.accepted:
+                    continue
+                unknown.append((location, best))
+            else:
+                unknown.append((location, None))
+
+        # a track the detector did not confirm but that overlaps a detection
+        # has drifted; the detection replaces it
+        stale = [t for t in free if any(iou(t.location, loc) > 0 for loc in faceCurrentFrame)]
+        self.tracks = [t for t in self.tracks if t not in stale]
+
+        if unknown:
+            matches = self._match(imgSmall, [location for location, _ in unknown])
+            for (location, track), match in zip(unknown, matches):
+                if track is None:
+                    self.tracks.append(Track(location, gray, match, now))
+                else:
+                    track.match = match
+
+    def _match(self, imgSmall, locations):
+        encodeCurrentFrame = self._timed(
+            "encode", face_recognition.face_encodings, imgSmall, locations
+        )
+        self.encodings += len(locations)
+        matches, fallbacks = self._timed(
+            "match", match_faces, self.gallery, encodeCurrentFrame, self.partition, self.fallback
+        )
+        self.fallbacks += fallbacks
+        return matches
+
+    def _timed(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _upscale(self, location):
+        factor = 1 / self.scale
+        return tuple(int(round(value * factor)) for value in location)
+
+
+def match_faces(gallery, encodings, partition=None, fallback=True):
+    """Match encodings against a gallery partition, or the whole gallery.
+
+    Returns the matches and how many of them only the whole-gallery
+    fallback recognized.
+    """
+    matches = gallery.matcher(partition=partition).match(encodings)
+    if partition is None or not fallback:
+        return matches, 0
+    missed = [i for i, match in enumerate(matches) if not match.accepted]
+    if not missed:
+        return matches, 0
+    found = 0
+    wider = gallery.matcher().match([encodings[i] for i in missed])
+    for i, match in zip(missed, wider):
+        if match.accepted:
+            matches[i] = match
+            found += 1
+    return matches, found
+
+
+def recognize_photos(gallery, images, max_side=2000, upsample=1, partition=None):
+    """Find and match every face in a batch of still photos, e.g. of a class.
+
+    Photos larger than ``max_side`` pixels are scaled down for detection,
+    which keeps HOG time bounded while leaving faces in a room-wide shot big
+    enough to find; ``upsample`` helps with the smallest ones. All faces are
+    matched against the gallery in one call. Returns a list of ``Face`` per
+    image, with locations in that image's own pixels. ``partition`` works
+    as for ``FaceRecognizer``, with the whole-gallery fallback.
+    """
+    locations = []
+    encodings = []
+    for img in images:
+        scale = min(1.0, max_side / max(img.shape[:2]))
+        small = cv2.resize(img, (0, 0), None, scale, scale) if scale < 1 else img
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        found = face_recognition.face_locations(small, upsample)
+        encodings.extend(face_recognition.face_encodings(small, found))
+        locations.append([tuple(int(round(v / scale)) for v in location) for location in found])
+
+    matches = iter(match_faces(gallery, encodings, partition)[0] if encodings else [])
+    return [[Face(location, next(matches)) for location in found] for found in locations]
@@ -0,0 +1,275 @@
+import json
+import sqlite3
+import threading
+import time
+
+REPLICA_FILE = "students.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    major TEXT,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _as_dict(data):
+    # Firebase returns a node whose keys are all small integers as a list
+    if isinstance(data, list):
+        return {str(key): value for key, value in enumerate(data) if value is not None}
+    return data or {}
+
+
+def _set_path(record, parts, value):
+    for part in parts[:-1]:
+        child = record.get(part)
+        if not isinstance(child, dict):
+            child = record[part] = {}
+        record = child
+    if value is None:
+        record.pop(parts[-1], None)
+    else:
+        record[parts[-1]] = value
+
+
+class StudentReplica:
+    """Local SQLite copy of the ``Students`` node for fast reads.
+
+    ``fetch`` returns the whole node and is used for the initial load and for
+    the periodic reconciliation pass. ``listen`` subscribes a callback to the
+    database's change stream (``db.reference("Students").listen``) and
+    returns a registration with ``close()``. Reads never touch the network,
+    so they keep working from the last known state while Firebase is
+    unreachable, and across restarts.
+
+    The app's own writes are applied locally as well as sent to Firebase, so
+    they are visible straight away; the listener echoes them back later.
+    ``on_change(fields)`` is called after any change has been applied, with
+    the top-level record fields that changed, or None when whole records
+    were added, replaced or removed.
+    """
+
+    def __init__(self, fetch, listen=None, path=REPLICA_FILE, reconcile_interval=300.0, on_change=None):
+        self.fetch = fetch
+        self.listen = listen
+        self.on_change = on_change
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.registration = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.events = 0
+        self.reconciles = 0
+        self.corrections = 0
+        self.last_sync = None
+        self.last_error = None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM students").fetchone()[0]
+
+    def start(self):
+        """Load the node, subscribe to changes and start reconciling."""
+        self.reconcile()
+        self._listen()
+        self.thread = threading.Thread(target=self._run, name="student-replica", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopped.set()
+        if self.registration is not None:
+            self.registration.close()
+        with self.lock:
+            self.conn.close()
+
+    def get(self, student_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM students WHERE id = ?", (str(student_id),)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_many(self, ids):
+        ids = [str(student_id) for student_id in ids]
+        if not ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, data FROM students WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {student_id: json.loads(data) for student_id, data in rows}
+
+    def partitions(self, field="major"):
+        """``{value: student IDs}`` grouping students by a record field.
+
+        A field holding a list (e.g. several courses) puts the student in
+        each of them; students without the field are left out.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT id, data FROM students").fetchall()
+        groups = {}
+        for student_id, data in rows:
+            values = json.loads(data).get(field)
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if value not in (None, ""):
+                    groups.setdefault(str(value), []).append(student_id)
+        return groups
+
+    def count(self, q=""):
+        where, params = self._where(q)
+        with self.lock:
+            return self.conn.execute(f"SELECT count(*) FROM students{where}", params).fetchone()[0]
+
+    def search(self, q="", offset=0, limit=None):
+        """Students ordered by ID whose ID, name or major contain ``q``."""
+        where, params = self._where(q)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, data FROM students{where} ORDER BY id LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+        students = []
+        for key, data in rows:
+            record = json.loads(data)
+            students.append(dict(record, id=record.get("id", key)))
+        return students
+
+    def set(self, student_id, record):
+        with self.lock, self.conn:
+            self._store(str(student_id), record)
+        self._changed(None)
+
+    def update(self, student_id, fields):
+        with self.lock, self.conn:
+            touched = self._apply([str(student_id)], fields, patch=True)
+        self._changed(touched)
+
+    def delete(self, student_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM students WHERE id = ?", (str(student_id),))
+        self._changed(None)
+
+    def reconcile(self):
+        """Replace the local copy with a full read; returns rows that differed."""
+        try:
+            students = _as_dict(self.fetch())
+        except Exception as e:
+            self.last_error = str(e)
+            return 0
+        with self.lock, self.conn:
+            local = dict(self.conn.execute("SELECT id, data FROM students"))
+            remote = {
+                str(key): json.dumps(record, sort_keys=True)
+                for key, record in students.items()
+                if isinstance(record, dict)
+            }
+            changed = [key for key, data in remote.items() if local.get(key) != data]
+            gone = [key for key in local if key not in remote]
+            for key in changed:
+                self._store(key, students[key])
+            self.conn.executemany("DELETE FROM students WHERE id = ?", [(key,) for key in gone])
+        self.reconciles += 1
+        self.corrections += len(changed) + len(gone)
+        self.last_sync = time.time()
+        self.last_error = None
+        if changed or gone:
+            self._changed(None)
+        return len(changed) + len(gone)
+
+    def on_event(self, event):
+        """Apply one listener event (``event_type``, ``path``, ``data``)."""
+        parts = [part for part in event.path.split("/") if part]
+        with self.lock, self.conn:
+            touched = self._apply(parts, event.data, patch=event.event_type == "patch")
+        self.events += 1
+        self.last_sync = time.time()
+        self._changed(touched)
+
+    def stats(self):
+        return {
+            "students": len(self),
+            "events": self.events,
+            "reconciles": self.reconciles,
+            "corrections": self.corrections,
+            "listening": self.registration is not None,
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+        }
+
+    def _changed(self, touched):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(None if touched is None or None in touched else touched)
+        except Exception as e:
+            self.last_error = str(e)
+
+    def _run(self):
+        while not self.stopped.wait(self.reconcile_interval):
+            self.reconcile()
+            if self.registration is None:
+                self._listen()
+
+    def _listen(self):
+        if self.listen is None:
+            return
+        try:
+            self.registration = self.listen(self.on_event)
+        except Exception as e:
+            self.registration = None
+            self.last_error = str(e)
+
+    def _where(self, q):
+        if not q:
+            return "", []
+        needle = q.lower()
+        return " WHERE instr(lower(id), ?) OR instr(lower(name), ?) OR instr(lower(major), ?)", [needle] * 3
+
+    def _apply(self, parts, data, patch=False):
+        # returns the top-level fields written, None standing for whole records
+        if patch:
+            # a patch is a set of puts relative to the event path
+            touched = set()
+            for key, value in _as_dict(data).items():
+                touched |= self._apply(parts + [part for part in key.split("/") if part], value)
+            return touched
+
+        if not parts:
+            self.conn.execute("DELETE FROM students")
+            for key, record in _as_dict(data).items():
+                if isinstance(record, dict):
+                    self._store(str(key), record)
+            return {None}
+
+        student_id = parts[0]
+        if len(parts) == 1:
+            if isinstance(data, dict):
+                self._store(student_id, data)
+            else:
+                self.conn.execute("DELETE FROM students WHERE id = ?", (student_id,))
+            return {None}
+
+        row = self.conn.execute("SELECT data FROM students WHERE id = ?", (student_id,)).fetchone()
+        record = {} if row is None else json.loads(row[0])
+        _set_path(record, parts[1:], data)
+        self._store(student_id, record)
+        return {parts[1]}
+
+    def _store(self, student_id, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?)",
+            (
+                student_id,
+                str(record.get("name") or ""),
+                str(record.get("major") or ""),
+                json.dumps(record, sort_keys=True),
+            ),
+        )
@@ -0,0 +1,303 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: file locks are no-ops, so files are not shared between workers
+    fcntl = None
+
+STATE_FILE = "state.db"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS marks (
+    session_id INTEGER NOT NULL,
+    student_id TEXT NOT NULL,
+    PRIMARY KEY (session_id, student_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+def owner():
+    # identifies this process as a lease holder; read per call, since
+    # pre-forking servers import the app before they fork the workers
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def lock_file(file, blocking=True):
+    """Lock an open file against other processes until it is closed.
+
+    Returns False when ``blocking`` is off and another process holds it.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+class FileLock:
+    """An exclusive lock on ``path`` shared by the processes on one host.
+
+    Re-entrant within a process; callers serialize their own threads first
+    (one process's open files do not exclude each other's threads).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.file = open(self.path, "a")
+            lock_file(self.file)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            self.file.close()
+            self.file = None
+
+
+class MemoryState:
+    """State shared by the threads of one process.
+
+    Every backend offers the same calls: attendance marks per session
+    (``add_mark`` is atomic, so exactly one caller wins a student, and
+    ``prune`` drops the sessions that are over), named
+    version counters that tell other workers something changed, settings
+    that any worker can change (e.g. a camera's partition), and leases that
+    give one worker a resource (a camera) until it stops renewing.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.marks = set()
+        self.versions = {}
+        self.settings = {}
+        self.leases = {}
+
+    def add_mark(self, session_id, student_id):
+        """Record a mark; False if the student already has one in that session."""
+        key = session_id, str(student_id)
+        with self.lock:
+            if key in self.marks:
+                return False
+            self.marks.add(key)
+            return True
+
+    def has_mark(self, session_id, student_id):
+        with self.lock:
+            return (session_id, str(student_id)) in self.marks
+
+    def prune(self, session_id):
+        """Forget the marks of every session before ``session_id``."""
+        with self.lock:
+            self.marks = {key for key in self.marks if key[0] >= session_id}
+
+    def version(self, name):
+        with self.lock:
+            return self.versions.get(name, 0)
+
+    def bump(self, name):
+        with self.lock:
+            self.versions[name] = self.versions.get(name, 0) + 1
+            return self.versions[name]
+
+    def setting(self, name):
+        """A setting's string value, None if it was never set."""
+        with self.lock:
+            return self.settings.get(name)
+
+    def set_setting(self, name, value):
+        with self.lock:
+            self.settings[name] = value
+
+    def acquire(self, name, owner, ttl):
+        """Take or renew a lease for ``ttl`` seconds; False while someone else holds it."""
+        now = self.clock()
+        with self.lock:
+            held = self.leases.get(name)
+            if held is not None and held[0] != owner and held[1] > now:
+                return False
+            self.leases[name] = owner, now + ttl
+            return True
+
+    def release(self, name, owner):
+        with self.lock:
+            if self.leases.get(name, (None,))[0] == owner:
+                del self.leases[name]
+
+    def holder(self, name):
+        with self.lock:
+            held = self.leases.get(name)
+        if held is None or held[1] <= self.clock():
+            return None
+        return held[0]
+
+    def close(self):
+        pass
+
+
+class SQLiteState:
+    """State in a SQLite file, shared by every worker process on one host.
+
+    Each call is a single statement or transaction, so SQLite's own locking
+    keeps concurrent workers consistent.
+    """
+
+    def __init__(self, path=STATE_FILE, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def add_mark(self, session_id, student_id):
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO marks VALUES (?, ?)", (session_id, str(student_id))
+            )
+        return cursor.rowcount == 1
+
+    def has_mark(self, session_id, student_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM marks WHERE session_id = ? AND student_id = ?",
+                (session_id, str(student_id)),
+            ).fetchone()
+        return row is not None
+
+    def prune(self, session_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM marks WHERE session_id < ?", (session_id,))
+
+    def version(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM versions WHERE name = ?", (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def bump(self, name):
+        with self.lock, self.conn:
+            (value,) = self.conn.execute(
+                "INSERT INTO versions VALUES (?, 1)"
+                " ON CONFLICT (name) DO UPDATE SET value = value + 1 RETURNING value",
+                (name,),
+            ).fetchone()
+        return value
+
+    def setting(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_setting(self, name, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, value))
+
+    def acquire(self, name, owner, ttl):
+        now = self.clock()
+        with self.lock, self.conn:
+            # takes a free or expired lease, or renews our own, in one statement
+            cursor = self.conn.execute(
+                "INSERT INTO leases VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires"
+                " WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+                (name, owner, now + ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, name, owner):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def holder(self, name):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT owner FROM leases WHERE name = ? AND expires > ?", (name, self.clock())
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _sqlite(path):
+    # sqlite:///state.db is relative, sqlite:////var/lib/cognito/state.db absolute
+    return SQLiteState(path[1:] if path.startswith("/") else path or STATE_FILE)
+
+
+# a network store registers its scheme here
+BACKENDS = {
+    "memory": lambda path: MemoryState(),
+    "sqlite": _sqlite,
+}
+
+
+def open_state(url="memory://"):
+    """Open the backend for ``url``: ``memory://`` or ``sqlite:///state.db``."""
+    scheme, sep, path = url.partition("://")
+    if not sep or scheme not in BACKENDS:
+        raise ValueError(f"Unknown state backend {url!r}")
+    return BACKENDS[scheme](path)
+
+
+class Lease:
+    """A named lease held by this process, renewed as it is used.
+
+    ``keep`` is cheap to call often: it only goes to the backend once a
+    third of ``ttl`` has passed since the last renewal.
+    """
+
+    def __init__(self, state, name, ttl=10.0, holder=None):
+        self.state = state
+        self.name = name
+        self.ttl = ttl
+        self.owner = holder or owner()
+        self.renewed = None
+
+    def acquire(self):
+        if not self.state.acquire(self.name, self.owner, self.ttl):
+            return False
+        self.renewed = time.monotonic()
+        return True
+
+    def keep(self):
+        """True while the lease is still ours."""
+        if self.renewed is None:
+            return False
+        if time.monotonic() - self.renewed < self.ttl / 3:
+            return True
+        if not self.acquire():
+            self.renewed = None
+            return False
+        return True
+
+    def release(self):
+        if self.renewed is not None:
+            self.state.release(self.name, self.owner)
+            self.renewed = None
@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gallery import IMAGE_FOLDER
+
+MANIFEST_FILE = "photo_manifest.json"
+
+
+def file_md5(path):
+    """Base64 MD5 of a file, the form Cloud Storage reports as ``md5_hash``."""
+    digest = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+class PhotoSync:
+    """Keeps the photos under ``folder`` in step with the same paths in a bucket.
+
+    Local content hashes are kept in a JSON manifest next to the file's size
+    and mtime, so a file is only re-hashed after it changes. ``sync`` lists the
+    remote blobs once, compares their MD5s with the manifest and uploads or
+    deletes only what differs, ``workers`` transfers at a time. Every transfer
+    goes through the one ``bucket`` handle.
+    """
+
+    def __init__(self, bucket, folder=IMAGE_FOLDER, manifest=MANIFEST_FILE, workers=4):
+        self.bucket = bucket
+        self.folder = folder
+        self.manifest_path = manifest
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.manifest = self._load()
+
+        self.uploads = 0
+        self.deletes = 0
+        self.last_sync = None
+        self.last_error = None
+
+    def scan(self):
+        """Local ``{blob name: md5}``, hashing only files that changed since the last scan."""
+        files = {}
+        seen = {}
+        with self.lock:
+            known = dict(self.manifest)
+        for entry in os.scandir(self.folder) if os.path.isdir(self.folder) else ():
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            stat = entry.stat()
+            name = self.blob_name(entry.name)
+            record = known.get(name)
+            if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+                record = {"md5": file_md5(entry.path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            seen[name] = record
+            files[name] = record["md5"]
+        with self.lock:
+            self.manifest = seen
+            self._save()
+        return files
+
+    def remote(self):
+        """Remote ``{blob name: md5}`` for every blob under the folder."""
+        prefix = self.blob_name("")
+        return {blob.name: blob.md5_hash for blob in self.bucket.list_blobs(prefix=prefix)}
+
+    def plan(self, delete=False):
+        """Blob names to upload and to delete to make the bucket match the folder."""
+        local = self.scan()
+        remote = self.remote()
+        uploads = sorted(name for name, md5 in local.items() if remote.get(name) != md5)
+        deletes = sorted(name for name in remote if name not in local) if delete else []
+        return uploads, deletes
+
+    def sync(self, delete=False):
+        """Upload changed photos; with ``delete``, also remove remote ones that are gone locally."""
+        start = time.perf_counter()
+        try:
+            uploads, deletes = self.plan(delete)
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="photo-sync") as pool:
+                # list() so the first failed transfer is raised here
+                list(pool.map(self._upload, uploads))
+                list(pool.map(self._delete, deletes))
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.last_sync = time.time()
+        self.last_error = None
+        return {
+            "uploaded": uploads,
+            "deleted": deletes,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def upload(self, filename):
+        """Upload one photo (a file in the folder) unless the bucket already has it."""
+        name = self.blob_name(os.path.basename(filename))
+        blob = self.bucket.get_blob(name)
+        md5 = file_md5(os.path.join(self.folder, os.path.basename(filename)))
+        if blob is not None and blob.md5_hash == md5:
+            return False
+        self._upload(name)
+        return True
+
+    def delete(self, filename):
+        """Delete one photo from the bucket, if it is there."""
+        name = self.blob_name(os.path.basename(filename))
+        with self.lock:
+            self.manifest.pop(name, None)
+            self._save()
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return False
+        blob.delete()
+        with self.lock:
+            self.deletes += 1
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "photos": len(self.manifest),
+                "uploads": self.uploads,
+                "deletes": self.deletes,
+                "last_sync": self.last_sync,
+                "last_error": self.last_error,
+            }
+
+    def blob_name(self, filename):
+        return f"{self.folder.strip('/')}/{filename}"
+
+    def _upload(self, name):
+        path = os.path.join(self.folder, name.rsplit("/", 1)[-1])
+        self.bucket.blob(name).upload_from_filename(path, content_type="image/jpeg")
+        with self.lock:
+            self.uploads += 1
+
+    def _delete(self, name):
+        self.bucket.blob(name).delete()
+        with self.lock:
+            self.deletes += 1
+
+    def _load(self):
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        # unique per writer, since every worker saves the manifest in its startup sync
+        tmp = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as file:
+            json.dump(self.manifest, file, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+DEFAULT_QUALITY = 80
+MIN_QUALITY = 30
+QUALITY_STEP = 10
+
+
+class Frame:
+    """A composed kiosk image, JPEG-encoded on demand and once per quality.
+
+    The canvas is copied because the kiosk draws the next frame into the same
+    buffer. Nothing is encoded until a client actually sends the frame, so
+    frames every viewer skips cost no encoding at all.
+    """
+
+    def __init__(self, canvas, observe=None):
+        self.image = canvas.copy()
+        self.observe = observe
+        self.lock = threading.Lock()
+        self.encoded = {}
+
+    def jpeg(self, quality=DEFAULT_QUALITY):
+        with self.lock:
+            data = self.encoded.get(quality)
+            if data is None:
+                start = time.perf_counter()
+                ret, buffer = cv2.imencode(".jpeg", self.image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                data = self.encoded[quality] = buffer.tobytes()
+                if self.observe is not None:
+                    self.observe(time.perf_counter() - start)
+            return data
+
+    def reuse(self, canvas):
+        """Take new contents into this frame's buffer; False while it is being encoded."""
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            np.copyto(self.image, canvas)
+            self.encoded = {}
+        finally:
+            self.lock.release()
+        return True
+
+
+class FramePool:
+    """Hands out ``Frame`` objects whose buffers are recycled, oldest first.
+
+    Only the newest frame is normally read, so a handful of buffers is
+    enough. Once the pool is full the oldest buffer is reused; one a client
+    is still encoding is passed over, and a new one is allocated only if
+    every buffer is busy. A client that reads a frame
+    after it was recycled simply sends the newer image.
+    """
+
+    def __init__(self, size=4, observe=None):
+        self.size = size
+        self.observe = observe
+        self.frames = deque()
+
+    def next(self, canvas):
+        if len(self.frames) == self.size:
+            for _ in range(self.size):
+                frame = self.frames.popleft()
+                self.frames.append(frame)
+                if frame.image.shape == canvas.shape and frame.reuse(canvas):
+                    return frame
+        frame = Frame(canvas, self.observe)
+        if len(self.frames) < self.size:
+            self.frames.append(frame)
+        return frame
+
+
+class StillFrames:
+    """Tells when a frame would render the same as the last one that was kept.
+
+    Frames are compared on a coarse grid of pixels; below ``threshold`` mean
+    absolute difference (0-255 scale) the camera is considered still. The
+    comparison is against the last frame that counted as changed, so slow
+    drift still gets through eventually.
+    """
+
+    def __init__(self, threshold=1.0, step=8):
+        self.threshold = threshold
+        self.step = step
+        self.sample = None
+        self.key = None
+
+    def __call__(self, img, key):
+        sample = img[:: self.step, :: self.step].astype(np.int16)
+        moved = (
+            self.sample is None
+            or self.sample.shape != sample.shape
+            or np.abs(sample - self.sample).mean() >= self.threshold
+        )
+        if moved:
+            self.sample = sample
+        still = not moved and key is self.key
+        self.key = key
+        return still
+
+
+def stream(slot, fps=0, quality=DEFAULT_QUALITY, min_quality=MIN_QUALITY):
+    """Yield JPEG bytes of the newest ``Frame`` in ``slot`` at most ``fps`` times a second.
+
+    The generator resumes only once the server has written the previous frame
+    out, so the time between a yield and its resumption is how long the
+    client's link took. When that exceeds the frame budget, quality steps down
+    towards ``min_quality``; with time to spare it climbs back to ``quality``.
+    Frames that arrive while a client is behind are skipped, not queued.
+    """
+    interval = 1.0 / fps if fps else 0.0
+    min_quality = min(min_quality, quality)
+    current = quality
+    seen = 0
+    due = 0.0
+    while True:
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        got = slot.get(seen, timeout=1.0)
+        if got is None:
+            if slot.closed:
+                return
+            continue
+        seen, frame = got
+
+        data = frame.jpeg(current)
+        start = time.monotonic()
+        yield data
+        sent = time.monotonic() - start
+
+        if interval:
+            if sent > interval:
+                current = max(min_quality, current - QUALITY_STEP)
+            elif sent < interval / 2 and current < quality:
+                current = min(quality, current + QUALITY_STEP // 2)
+        due = start + interval
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from gallery import IMAGE_FOLDER
+
+THUMB_FOLDER = "thumbnails"
+SIZES = (64, 128, 216)
+
+
+class Thumbnails:
+    """Square student photo thumbnails in a few fixed sizes, cached on disk.
+
+    Thumbnails are made from the original in ``source_folder``, or from the
+    bytes ``fetch(student_id)`` returns when there is no local copy (e.g. a
+    Cloud Storage download). They are written at enrollment and rebuilt on
+    the next request whenever the original is newer or they are missing.
+    """
+
+    def __init__(self, folder=THUMB_FOLDER, source_folder=IMAGE_FOLDER, fetch=None, sizes=SIZES, quality=80):
+        self.folder = folder
+        self.source_folder = source_folder
+        self.fetch = fetch
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.etags = {}
+
+    def size_for(self, size):
+        """The smallest stored size at least ``size`` pixels wide."""
+        for stored in self.sizes:
+            if stored >= size:
+                return stored
+        return self.sizes[-1]
+
+    def path(self, student_id, size):
+        """Path of the ``size`` thumbnail, generating it if needed; None if there is no photo."""
+        if not _safe(student_id):
+            return None
+        path = self._thumb_path(student_id, self.size_for(size))
+        source = self._source_path(student_id)
+        try:
+            fresh = os.path.getmtime(path) >= os.path.getmtime(source)
+        except FileNotFoundError:
+            fresh = os.path.exists(path) and not os.path.exists(source)
+        if not fresh and not self.generate(student_id):
+            return None
+        return path
+
+    def etag(self, path):
+        """Strong ETag for a thumbnail: the SHA-1 of its bytes, kept per file version."""
+        stat = os.stat(path)
+        key = path, stat.st_mtime_ns, stat.st_size
+        with self.lock:
+            etag = self.etags.get(key)
+        if etag is None:
+            with open(path, "rb") as file:
+                etag = hashlib.sha1(file.read()).hexdigest()
+            with self.lock:
+                self.etags[key] = etag
+        return etag
+
+    def generate(self, student_id):
+        """Write every size for ``student_id``; False if no photo can be read."""
+        if not _safe(student_id):
+            return False
+        source = self._source_path(student_id)
+        img = cv2.imread(source) if os.path.exists(source) else None
+        if img is None and self.fetch is not None:
+            data = self.fetch(student_id)
+            if data:
+                img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return False
+
+        # centre square crop, so every size has the same framing
+        h, w = img.shape[:2]
+        side = min(h, w)
+        img = img[(h - side) // 2 : (h - side) // 2 + side, (w - side) // 2 : (w - side) // 2 + side]
+        for size in self.sizes:
+            thumb = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            path = self._thumb_path(student_id, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as file:
+                file.write(buffer.tobytes())
+            os.replace(tmp, path)
+        return True
+
+    def remove(self, student_id):
+        if not _safe(student_id):
+            return
+        for size in self.sizes:
+            try:
+                os.remove(self._thumb_path(student_id, size))
+            except FileNotFoundError:
+                pass
+
+    def _thumb_path(self, student_id, size):
+        return os.path.join(self.folder, str(size), f"{student_id}.jpg")
+
+    def _source_path(self, student_id):
+        return os.path.join(self.source_folder, f"{student_id}.jpg")
+
+
+def _safe(student_id):
+    student_id = str(student_id)
+    return bool(student_id) and os.path.basename(student_id) == student_id and not student_id.startswith(".")